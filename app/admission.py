@@ -0,0 +1,189 @@
+"""
+Admission control.
+
+Work is split into lanes, each with its own bound on in-flight work, so one kind of
+overload can't starve the others:
+
+- realtime: database work of socket frames (chat delivery). Never rejected; it runs on a
+  dedicated executor so it doesn't queue behind HTTP requests in the threadpool. The slot
+  is released before the frame is sent, so slow recipients can't hold it.
+- interactive: pages and API reads (dashboard, roster, history)
+- auth: login/signup/password POSTs (bcrypt)
+- background: attachment uploads and the archiver
+
+Attachment downloads and thumbnails bypass admission: a slot would be held for the whole
+transfer, and slow clients would inflate the lane's service time for everyone else.
+
+When an HTTP lane is full, requests queue, but only while the expected wait (queue
+length x recent service time / limit) fits the lane's latency budget. Past that they
+get an immediate 503 with Retry-After, rather than timing out after holding a slot
+that someone else could have used.
+"""
+import asyncio, contextvars, functools, math, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from .config import Config
+from .metrics import admission_in_flight, admission_wait_seconds, admission_rejected
+from .serialization import FastJSONResponse
+
+
+class Lane:
+    def __init__(self, name: str, limit: int, max_wait: float | None):
+        self.name = name
+        self.limit = limit
+        # Latency budget for queueing, None = wait as long as it takes
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        # Moving average of how long a slot is held (seconds)
+        self.service_time = 0.05
+
+    def estimated_wait(self) -> float:
+        return (len(self.waiters) + 1) * self.service_time / self.limit
+
+    async def acquire(self, reject: bool = True) -> bool:
+        """Take a slot, queueing if needed. Returns False when the wait would exceed the budget."""
+        if self.in_flight < self.limit and not self.waiters:
+            self._take()
+            return True
+
+        max_wait = self.max_wait if reject else None
+        if max_wait is not None and self.estimated_wait() > max_wait:
+            admission_rejected.inc(labels=(self.name,))
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                return True  # Handed a slot just as the budget ran out
+            self._forget(waiter)
+            admission_rejected.inc(labels=(self.name,))
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(0.0)
+            else:
+                self._forget(waiter)
+            raise
+        finally:
+            admission_wait_seconds.observe(time.perf_counter() - started, (self.name,))
+        return True
+
+    def release(self, held_for: float):
+        self.service_time += (held_for - self.service_time) * 0.1
+        self.in_flight -= 1
+        admission_in_flight.set(self.in_flight, (self.name,))
+        # Hand free slots straight to the oldest waiters
+        while self.waiters and self.in_flight < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self._take()
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def hold(self):
+        """Slot for internal work: waits instead of being rejected"""
+        await self.acquire(reject=False)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.estimated_wait()))
+
+    def report(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self.waiters),
+            "service_ms": round(self.service_time * 1000, 1),
+            "max_wait_ms": self.max_wait * 1000 if self.max_wait is not None else None
+        }
+
+    def _take(self):
+        self.in_flight += 1
+        admission_in_flight.set(self.in_flight, (self.name,))
+
+    def _forget(self, waiter: asyncio.Future):
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+def _budget(milliseconds: int) -> float | None:
+    return milliseconds / 1000 if milliseconds > 0 else None
+
+
+lanes = {
+    "realtime": Lane("realtime", Config.ADMISSION_REALTIME_LIMIT, None),
+    "interactive": Lane("interactive", Config.ADMISSION_INTERACTIVE_LIMIT, _budget(Config.ADMISSION_INTERACTIVE_MAX_WAIT_MS)),
+    "auth": Lane("auth", Config.ADMISSION_AUTH_LIMIT, _budget(Config.ADMISSION_AUTH_MAX_WAIT_MS)),
+    "background": Lane("background", Config.ADMISSION_BACKGROUND_LIMIT, _budget(Config.ADMISSION_BACKGROUND_MAX_WAIT_MS)),
+}
+
+
+def classify(scope) -> str | None:
+    """Lane for an HTTP request, None for requests that bypass admission"""
+    path = scope["path"]
+    if path.startswith(("/static", "/metrics", "/admin")):
+        return None
+    if path.startswith("/auth") and scope["method"] == "POST":
+        return "auth"
+    if path.startswith("/api/attachments"):
+        return "background" if scope["method"] == "POST" else None
+    return "interactive"
+
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware: admit each HTTP request into its lane or answer 503"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope) if scope["type"] == "http" else None
+        if name is None:
+            return await self.app(scope, receive, send)
+
+        lane = lanes[name]
+        if not await lane.acquire():
+            response = FastJSONResponse(
+                {"detail": "Server busy, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(lane.retry_after())}
+            )
+            return await response(scope, receive, send)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release(time.perf_counter() - started)
+
+
+# Realtime Executor --- --- --- --- ---
+
+@lru_cache(maxsize=1)
+def get_realtime_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=Config.REALTIME_WORKERS, thread_name_prefix="realtime")
+
+
+async def run_realtime(function, *args):
+    """
+    Run blocking chat-delivery work (DB writes) on the dedicated executor, keeping contextvars.
+    Holds a realtime lane slot only while the work runs.
+    """
+    context = contextvars.copy_context()
+    async with lanes["realtime"].hold():
+        return await asyncio.get_running_loop().run_in_executor(
+            get_realtime_pool(), functools.partial(context.run, function, *args)
+        )
@@ -0,0 +1,263 @@
+"""
+Message archival.
+
+The hot `messages` table only keeps recent traffic. A background job moves read
+messages older than Config.ARCHIVE_AFTER_DAYS (rounded down to a whole month) into
+`message_archives`, one zlib-compressed blob per conversation per month, and deletes
+them from the hot table. History reads page through the hot table first and fall
+back to the archive transparently once they go past the hot window.
+
+Every worker runs the archiver. A batch is claimed with SELECT ... FOR UPDATE SKIP
+LOCKED, and blobs are upserted on the unique (conversation, month) key, so concurrent
+archivers never archive the same message twice or split a month into two blobs.
+"""
+import asyncio, json, zlib
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, and_, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .config import Config
+from .database import SessionLocal
+from .models import Message, MessageArchive
+from .admission import lanes
+
+# Read-only view of a message, whether it comes from the hot table or an archive blob
+HistoryEntry = namedtuple("HistoryEntry", ["id", "sender_id", "receiver_id", "content", "timestamp", "attachment"],
+                          defaults=(None,))
+
+
+def conversation_participants(user_a: int, user_b: int) -> tuple[int, int]:
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+def encode_payload(rows: list[list]) -> bytes:
+    return zlib.compress(json.dumps(rows, separators=(",", ":")).encode(), level=6)
+
+
+def search_terms(rows: list[list]) -> str:
+    """Distinct words of the archived messages, indexed for FULLTEXT search on MySQL"""
+    from .search import tokenize  # search imports this module
+    return " ".join(sorted({term for row in rows for term in tokenize(row[2])}))
+
+
+def fill_archive(archive: MessageArchive, rows: list[list]):
+    """Store rows (sorted by id) in the blob and refresh its summary columns"""
+    archive.payload = encode_payload(rows)
+    archive.first_message_id = rows[0][0]
+    archive.last_message_id = rows[-1][0]
+    archive.message_count = len(rows)
+    archive.search_terms = search_terms(rows)
+
+
+def merge_rows(existing: list[list], rows: list[list]) -> list[list]:
+    """Union by message id, so re-archiving a message never duplicates it"""
+    return sorted({row[0]: row for row in existing + rows}.values(), key=lambda row: row[0])
+
+
+def decode_payload(archive: MessageArchive) -> list[HistoryEntry]:
+    """Unpack an archive blob; rows are stored as [id, sender_id, content, timestamp(, attachment)]"""
+    entries = []
+    for message_id, sender_id, content, timestamp, *attachment in json.loads(zlib.decompress(archive.payload)):
+        receiver_id = archive.user_high_id if sender_id == archive.user_low_id else archive.user_low_id
+        entries.append(HistoryEntry(
+            message_id, sender_id, receiver_id, content, datetime.fromisoformat(timestamp), *attachment
+        ))
+    return entries
+
+
+def archive_cutoff(now: datetime | None = None) -> datetime:
+    """Start of the month containing (now - ARCHIVE_AFTER_DAYS); everything before it is cold"""
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    boundary = now - timedelta(days=Config.ARCHIVE_AFTER_DAYS)
+    return boundary.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def archive_cold_messages(db: Session, cutoff: datetime | None = None, batch_size: int | None = None) -> int:
+    """
+    Move one batch of cold, read messages into monthly archive blobs.
+    Returns the number of messages archived (0 when there is nothing left to do).
+    Unread messages stay hot so unread counts never need to consult the archive.
+    """
+    cutoff = cutoff or archive_cutoff()
+    batch_size = batch_size or Config.ARCHIVE_BATCH_SIZE
+
+    # Oldest ids first: ids grow with timestamps, so this stops early without a timestamp index.
+    # Rows another worker is archiving right now are skipped rather than waited for.
+    batch = db.query(Message).filter(
+        Message.timestamp < cutoff,
+        Message.is_read == True
+    ).order_by(Message.id.asc()).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    if not batch:
+        db.rollback()
+        return 0
+
+    # Group by (conversation, month)
+    groups: dict[tuple[int, int, str], list[Message]] = {}
+    for message in batch:
+        low, high = conversation_participants(message.sender_id, message.receiver_id)
+        groups.setdefault((low, high, message.timestamp.strftime("%Y-%m")), []).append(message)
+
+    try:
+        for (low, high, period), messages in groups.items():
+            # Attachment hashes are only stored when present, keeping plain rows at four fields
+            rows = [
+                [m.id, m.sender_id, m.content, m.timestamp.isoformat()] + ([m.attachment_sha256] if m.attachment_sha256 else [])
+                for m in messages
+            ]
+            upsert_archive(db, low, high, period, rows)
+
+        db.query(Message).filter(Message.id.in_([m.id for m in batch])).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(batch)
+
+
+def upsert_archive(db: Session, low: int, high: int, period: str, rows: list[list]):
+    """Merge rows into the conversation-month blob, creating it if needed"""
+    def locked_archive():
+        return db.query(MessageArchive).filter(
+            MessageArchive.user_low_id == low,
+            MessageArchive.user_high_id == high,
+            MessageArchive.period == period
+        ).with_for_update().first()
+
+    archive = locked_archive()
+    if archive is None:
+        archive = MessageArchive(user_low_id=low, user_high_id=high, period=period)
+        fill_archive(archive, rows)
+        try:
+            with db.begin_nested():
+                db.add(archive)
+            return
+        except IntegrityError:
+            # Another worker created this blob first; merge into theirs
+            archive = locked_archive()
+
+    fill_archive(archive, merge_rows(json.loads(zlib.decompress(archive.payload)), rows))
+
+
+def repair_archives(db: Session) -> int:
+    """
+    Migration step: merge duplicate conversation-month blobs (written by concurrent
+    archivers before the unique key existed) and fill in missing search terms.
+    Returns the number of blobs changed.
+    """
+    changed = 0
+    duplicates = db.query(MessageArchive.user_low_id, MessageArchive.user_high_id, MessageArchive.period) \
+        .group_by(MessageArchive.user_low_id, MessageArchive.user_high_id, MessageArchive.period) \
+        .having(func.count(MessageArchive.id) > 1).all()
+    for low, high, period in duplicates:
+        archives = db.query(MessageArchive).filter(
+            MessageArchive.user_low_id == low,
+            MessageArchive.user_high_id == high,
+            MessageArchive.period == period
+        ).order_by(MessageArchive.id).all()
+        rows = []
+        for archive in archives:
+            rows = merge_rows(rows, json.loads(zlib.decompress(archive.payload)))
+        fill_archive(archives[0], rows)
+        for archive in archives[1:]:
+            db.delete(archive)
+        changed += len(archives)
+    db.commit()
+
+    while True:
+        archives = db.query(MessageArchive).filter(MessageArchive.search_terms.is_(None)).limit(100).all()
+        if not archives:
+            return changed
+        for archive in archives:
+            archive.search_terms = search_terms(json.loads(zlib.decompress(archive.payload)))
+        db.commit()
+        changed += len(archives)
+
+
+def load_history(db: Session, user_id: int, other_id: int, before: int | None = None,
+                 limit: int | None = None) -> list[HistoryEntry]:
+    """
+    Conversation history in ascending order.
+    With `limit`, returns the newest `limit` messages older than message id `before`,
+    reading the hot table first and only opening archive blobs when the page extends past it.
+    """
+    hot = db.query(
+        Message.id, Message.sender_id, Message.receiver_id, Message.content, Message.timestamp, Message.attachment_sha256
+    ).filter(
+        ((Message.sender_id == user_id) & (Message.receiver_id == other_id)) |
+        ((Message.sender_id == other_id) & (Message.receiver_id == user_id))
+    )
+    if before is not None:
+        hot = hot.filter(Message.id < before)
+    hot = hot.order_by(Message.id.desc())
+    if limit is not None:
+        hot = hot.limit(limit)
+
+    entries = [HistoryEntry(*row) for row in hot.all()]
+
+    # A full page only needs archived rows interleaved with it (unread messages stay hot longer)
+    floor = entries[-1].id if limit is not None and len(entries) == limit else 0
+
+    low, high = conversation_participants(user_id, other_id)
+    archives = db.query(MessageArchive).filter(
+        MessageArchive.user_low_id == low,
+        MessageArchive.user_high_id == high,
+        MessageArchive.last_message_id > floor
+    )
+    if before is not None:
+        archives = archives.filter(MessageArchive.first_message_id < before)
+
+    archived = []
+    for archive in archives.order_by(MessageArchive.last_message_id.desc()).yield_per(8):
+        archived.extend(
+            entry for entry in decode_payload(archive)
+            if entry.id > floor and (before is None or entry.id < before)
+        )
+        if limit is not None and len(archived) >= limit:
+            break
+
+    entries.extend(archived)
+    entries.sort(key=lambda entry: entry.id, reverse=True)
+    if limit is not None:
+        entries = entries[:limit]
+    entries.reverse()
+    return entries
+
+
+def find_archived_messages(db: Session, message_ids: list[int]) -> list[HistoryEntry]:
+    """Resolve message ids that are no longer in the hot table"""
+    if not message_ids:
+        return []
+
+    wanted = set(message_ids)
+    archives = db.query(MessageArchive).filter(or_(*(
+        and_(MessageArchive.first_message_id <= message_id, MessageArchive.last_message_id >= message_id)
+        for message_id in wanted
+    )))
+    return [entry for archive in archives for entry in decode_payload(archive) if entry.id in wanted]
+
+
+async def run_archiver():
+    """Background loop: drain cold messages in batches, then sleep until the next interval"""
+    while True:
+        try:
+            archived = 1
+            while archived:
+                async with lanes["background"].hold():
+                    archived = await asyncio.to_thread(_archive_batch)
+        except Exception as e:
+            print(f"Archival error: {e}")
+        await asyncio.sleep(Config.ARCHIVE_INTERVAL_SECONDS)
+
+
+def _archive_batch() -> int:
+    db = SessionLocal()
+    try:
+        archived = archive_cold_messages(db)
+        if archived:
+            print(f"--- ARCHIVED {archived} MESSAGES ---")
+        return archived
+    finally:
+        db.close()
@@ -0,0 +1,143 @@
+"""
+File attachments.
+
+Uploads are streamed: the request body is read chunk by chunk, hashed as it arrives
+and written to a temporary file off the event loop, so memory use stays flat no matter
+how large the file is. The file is then stored under its SHA-256
+(MEDIA_ROOT/ab/cd/<hash>), which deduplicates repeated uploads for free; the temp file
+is simply dropped when the hash is already on disk. Downloads are served straight from
+that path with FileResponse (range requests, sendfile/pathsend where the server
+supports it). Thumbnails are generated lazily in a process pool when Pillow is installed.
+"""
+import asyncio, hashlib, os, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from fastapi import HTTPException, Request
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .config import Config
+from .models import Attachment
+
+# Disk writes are batched so each thread hop moves about this much data
+WRITE_BATCH_BYTES = 1024 * 1024
+THUMBNAIL_SIZE = 320
+
+
+def attachment_path(sha256: str) -> str:
+    return os.path.join(Config.MEDIA_ROOT, sha256[:2], sha256[2:4], sha256)
+
+
+def thumbnail_path(sha256: str) -> str:
+    return attachment_path(sha256) + ".thumb.jpg"
+
+
+def is_sha256(value: str) -> bool:
+    return len(value) == 64 and all(c in "0123456789abcdef" for c in value)
+
+
+async def receive_upload(request: Request, max_bytes: int | None = None) -> tuple[str, int]:
+    """
+    Stream the request body to disk. Returns (sha256, size) once the file is in place.
+    Raises 413 as soon as the body exceeds `max_bytes`.
+    """
+    max_bytes = max_bytes or Config.MAX_UPLOAD_BYTES
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    os.makedirs(Config.MEDIA_ROOT, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix="upload-", dir=Config.MEDIA_ROOT)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pending: list[bytes] = []
+            pending_bytes = 0
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="File too large")
+                digest.update(chunk)
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= WRITE_BATCH_BYTES:
+                    await asyncio.to_thread(f.writelines, pending)
+                    pending, pending_bytes = [], 0
+            if pending:
+                await asyncio.to_thread(f.writelines, pending)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+
+        sha256 = digest.hexdigest()
+        await asyncio.to_thread(_store, temp_path, attachment_path(sha256))
+        return sha256, size
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _store(temp_path: str, final_path: str):
+    """Move the temp file into place, unless the same content is already stored"""
+    if os.path.exists(final_path):
+        return
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(temp_path, final_path)
+
+
+def get_or_create_attachment(db: Session, sha256: str, size: int, content_type: str, user_id: int) -> Attachment:
+    attachment = db.query(Attachment).filter(Attachment.sha256 == sha256).first()
+    if attachment:
+        return attachment
+
+    attachment = Attachment(sha256=sha256, size=size, content_type=content_type, uploaded_by=user_id)
+    db.add(attachment)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Same file uploaded concurrently by someone else
+        db.rollback()
+        return db.query(Attachment).filter(Attachment.sha256 == sha256).first()
+    db.refresh(attachment)
+    return attachment
+
+
+def attachment_exists(db: Session, sha256: str) -> bool:
+    return db.query(Attachment.id).filter(Attachment.sha256 == sha256).first() is not None
+
+
+# Thumbnails --- --- --- --- ---
+
+@lru_cache(maxsize=1)
+def get_thumbnail_pool() -> ProcessPoolExecutor:
+    """Created on first use so workers that never see an image don't fork a pool"""
+    return ProcessPoolExecutor(max_workers=Config.THUMBNAIL_WORKERS)
+
+
+def render_thumbnail(source: str, target: str, size: int = THUMBNAIL_SIZE) -> bool:
+    """Runs in a worker process. Returns False when Pillow is missing or the file isn't an image"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return False
+    try:
+        with Image.open(source) as image:
+            image.thumbnail((size, size))
+            temp = target + ".tmp"
+            image.convert("RGB").save(temp, "JPEG", quality=80)
+        os.replace(temp, target)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+async def ensure_thumbnail(sha256: str) -> str | None:
+    """Path of the thumbnail, rendering it on first request; None if one can't be made"""
+    target = thumbnail_path(sha256)
+    if os.path.exists(target):
+        return target
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(get_thumbnail_pool(), render_thumbnail, attachment_path(sha256), target)
+    return target if rendered else None
@@ -46,9 +46,19 @@ def verify_access_token(token: str):
         print("Invalid token")
         return None
     
+def require_user_id(access_token: str | None) -> int:
+    """User id from the Authorization cookie, 401 when it is missing, invalid or expired"""
+    user_id = verify_access_token(access_token) if access_token else None
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return int(user_id)
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_database)):
-    user = verify_access_token(token=token)
-    user = db.query(User).filter(User.email == user[0]).first()
+    user_id = verify_access_token(token=token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    # The token subject is the user id; a primary key lookup (served from the identity map if already loaded)
+    user = db.get(User, int(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
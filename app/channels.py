@@ -0,0 +1,120 @@
+"""
+Group channels.
+
+A channel message is stored once in `channel_messages` and delivered to the members
+that are currently connected. Member lists are cached in memory per channel (reloaded
+after a TTL, since other workers change them too) so a send doesn't load
+`channel_members`; the online recipients are found by intersecting the member set with
+the connection registry from whichever side is smaller, so the cost follows the number
+of online members rather than the size of the channel. Access checks always ask the
+database, never the cache. Read state
+is a per-member cursor (last_read_message_id) instead of a flag on every row.
+"""
+import asyncio, threading, time
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .config import Config
+from .models import Channel, ChannelMember, ChannelMessage
+
+
+class ChannelRegistry:
+    """channel_id -> member ids for picking recipients, filled lazily and reloaded after `ttl` seconds"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.members: dict[int, set[int]] = {}
+        self.loaded_at: dict[int, float] = {}
+        self.lock = threading.Lock()
+
+    def cached_members(self, channel_id: int) -> set[int] | None:
+        """Members without touching the database, None when not cached or stale"""
+        loaded_at = self.loaded_at.get(channel_id)
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            return None
+        return self.members.get(channel_id)
+
+    def get_members(self, db: Session, channel_id: int) -> set[int]:
+        members = self.cached_members(channel_id)
+        if members is None:
+            rows = db.query(ChannelMember.user_id).filter(ChannelMember.channel_id == channel_id).all()
+            members = self.set_members(channel_id, {user_id for (user_id,) in rows})
+        return members
+
+    def set_members(self, channel_id: int, members: set[int]) -> set[int]:
+        with self.lock:
+            self.members[channel_id] = members
+            self.loaded_at[channel_id] = time.monotonic()
+        return members
+
+    def is_member(self, db: Session, channel_id: int, user_id: int) -> bool:
+        """Authorization check, answered by the database since the cache may lag other workers"""
+        found = db.query(ChannelMember.user_id).filter(
+            ChannelMember.channel_id == channel_id,
+            ChannelMember.user_id == user_id
+        ).first() is not None
+
+        # Correct the cached set with what we just saw
+        if found:
+            self.add_member(channel_id, user_id)
+        else:
+            self.remove_member(channel_id, user_id)
+        return found
+
+    def add_member(self, channel_id: int, user_id: int):
+        with self.lock:
+            if channel_id in self.members:
+                self.members[channel_id].add(user_id)
+
+    def remove_member(self, channel_id: int, user_id: int):
+        with self.lock:
+            if channel_id in self.members:
+                self.members[channel_id].discard(user_id)
+
+
+channel_registry = ChannelRegistry(Config.CHANNEL_MEMBERS_TTL_SECONDS)
+
+
+def online_members(members: set[int], connections: dict) -> list[int]:
+    """Members with an open socket, iterating whichever collection is smaller"""
+    if len(members) <= len(connections):
+        return [user_id for user_id in members if user_id in connections]
+    return [user_id for user_id in connections if user_id in members]
+
+
+async def fan_out(frame: str, recipients: list[int], manager) -> int:
+    """Send one pre-encoded frame to every recipient concurrently, returns deliveries"""
+    results = await asyncio.gather(*(manager.deliver(frame, user_id) for user_id in recipients))
+    return sum(results)
+
+
+def create_channel(db: Session, name: str, creator_id: int, member_ids: list[int]) -> Channel:
+    channel = Channel(name=name, created_by=creator_id)
+    db.add(channel)
+    db.flush()
+    for user_id in {creator_id, *member_ids}:
+        db.add(ChannelMember(channel_id=channel.id, user_id=user_id))
+    db.commit()
+    db.refresh(channel)
+    return channel
+
+
+def channels_with_unread(db: Session, user_id: int) -> list[tuple[int, str, int]]:
+    """(channel id, name, unread count) for each channel the user belongs to, in one query"""
+    return db.query(Channel.id, Channel.name, func.count(ChannelMessage.id)).join(
+        ChannelMember, (ChannelMember.channel_id == Channel.id) & (ChannelMember.user_id == user_id)
+    ).outerjoin(
+        ChannelMessage,
+        (ChannelMessage.channel_id == Channel.id) &
+        (ChannelMessage.id > ChannelMember.last_read_message_id) &
+        (ChannelMessage.sender_id != user_id)  # Own messages are never unread
+    ).group_by(Channel.id, Channel.name).all()
+
+
+def advance_read_cursor(db: Session, channel_id: int, user_id: int, message_id: int):
+    """Move the member's cursor forward (never backwards)"""
+    db.query(ChannelMember).filter(
+        ChannelMember.channel_id == channel_id,
+        ChannelMember.user_id == user_id,
+        ChannelMember.last_read_message_id < message_id
+    ).update({"last_read_message_id": message_id}, synchronize_session=False)
+    db.commit()
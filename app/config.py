@@ -14,10 +14,77 @@ class Config:
     DB_HOST = os.getenv("DATABASE_HOST", "localhost")
     DB_PORT = int(os.getenv("DATABASE_PORT", 3306))
     DB_NAME = os.getenv("DATABASE_NAME")
+
+    # Optional full connection string (e.g. sqlite:///./nexus.db), overrides the MySQL settings above
+    DATABASE_URL = os.getenv("DATABASE_URL")
+
+    # Read replicas (comma separated URLs); read-only routes use them when they are within
+    # REPLICA_MAX_LAG_SECONDS, and a session that just wrote reads from the primary for
+    # READ_YOUR_WRITES_SECONDS so it always sees its own changes
+    REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 2))
+    REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", 5))
+    READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+    # Log every SQL statement (debugging only, very noisy)
+    SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
+    # Search Settings (on-disk index used when the database has no FULLTEXT support)
+    SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "data/search-index.log")
     
     # Mail Settings
     MAIL_PWD = os.getenv("MAIL_APP_PASSWORD")
 
+    # Attachment Settings
+    MEDIA_ROOT = os.getenv("MEDIA_ROOT", "data/media")
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+    THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
+
+    # Archival Settings (read messages older than this move to compressed monthly archives)
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+    ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", 3600))
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 5000))
+
+    # How often each worker picks up users registered through other workers
+    DIRECTORY_REFRESH_SECONDS = int(os.getenv("DIRECTORY_REFRESH_SECONDS", 30))
+
+    # Operations Settings (admin endpoints and request profiling are disabled without a token)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    WATCHDOG_INTERVAL_MS = int(os.getenv("WATCHDOG_INTERVAL_MS", 100))
+    WATCHDOG_THRESHOLD_MS = int(os.getenv("WATCHDOG_THRESHOLD_MS", 250))
+
+    # Recompile templates when they change on disk (development only)
+    TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "false").lower() == "true"
+
+    # Threads reserved for bcrypt so async routes never hash on the event loop
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 4))
+
+    # Minimum gap between repeated ephemeral signals (typing) from one sender to one target
+    SIGNAL_MIN_INTERVAL_MS = int(os.getenv("SIGNAL_MIN_INTERVAL_MS", 1000))
+
+    # How long a worker trusts its cached channel member list before reloading it
+    # (other workers add and remove members too)
+    CHANNEL_MEMBERS_TTL_SECONDS = float(os.getenv("CHANNEL_MEMBERS_TTL_SECONDS", 60))
+
+    # Admission Control: concurrent work per lane, and how long a request may queue (ms)
+    # before it is answered with 503 + Retry-After (0 = queue without a limit)
+    ADMISSION_REALTIME_LIMIT = int(os.getenv("ADMISSION_REALTIME_LIMIT", 32))
+    ADMISSION_INTERACTIVE_LIMIT = int(os.getenv("ADMISSION_INTERACTIVE_LIMIT", 8))
+    ADMISSION_INTERACTIVE_MAX_WAIT_MS = int(os.getenv("ADMISSION_INTERACTIVE_MAX_WAIT_MS", 500))
+    ADMISSION_AUTH_LIMIT = int(os.getenv("ADMISSION_AUTH_LIMIT", 8))
+    ADMISSION_AUTH_MAX_WAIT_MS = int(os.getenv("ADMISSION_AUTH_MAX_WAIT_MS", 2000))
+    ADMISSION_BACKGROUND_LIMIT = int(os.getenv("ADMISSION_BACKGROUND_LIMIT", 2))
+    ADMISSION_BACKGROUND_MAX_WAIT_MS = int(os.getenv("ADMISSION_BACKGROUND_MAX_WAIT_MS", 5000))
+    # Threads reserved for chat delivery database work
+    REALTIME_WORKERS = int(os.getenv("REALTIME_WORKERS", 4))
+
+    # Drain Settings (shutdown / redeploy)
+    DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", 10))
+    RECONNECT_JITTER_MS = int(os.getenv("RECONNECT_JITTER_MS", 10000))
+    PRESENCE_GRACE_SECONDS = float(os.getenv("PRESENCE_GRACE_SECONDS", 15))
+    # Sockets that send nothing, not even a heartbeat, for this long are closed (0 = never)
+    SOCKET_IDLE_TIMEOUT_SECONDS = float(os.getenv("SOCKET_IDLE_TIMEOUT_SECONDS", 90))
+
     # Default Settings
     ACCESS_TOKEN_EXPIRE_MINUTES=60*24*2
     ALGORITHM="HS256"
@@ -26,10 +93,11 @@ class Config:
     # Mandatory check: Fail fast if critical keys are missing
     @classmethod
     def validate(cls):
-        required = ["SECRET_KEY", "DB_USER", "DB_PASSWORD", "DB_NAME"]
+        required = ["SECRET_KEY"]
+        if not cls.DATABASE_URL:
+            required += ["DB_USER", "DB_PASSWORD", "DB_NAME"]
         for key in required:
             if not getattr(cls, key):
                 raise ValueError(f"CRITICAL: {key} is not set in .env")
 
-# Run validation on startup
-Config.validate()
+# Validation runs in the app lifespan (app/main.py), so importing modules has no side effects
@@ -1,6 +1,10 @@
-from sqlalchemy import create_engine
+import threading, time
+from fastapi import Depends
+from fastapi.requests import HTTPConnection
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
 from .config import Config
+from .metrics import InstrumentedQueuePool, instrument_engine
 
 
 # Pull database credentials from the environment
@@ -10,11 +14,25 @@ database_host = Config.DB_HOST
 database_port = Config.DB_PORT
 database_name = Config.DB_NAME
 
-# Construct the connection string for the MySQL database using the PyMySQL driver
-DATABASE_URL = f"mysql+pymysql://{database_user}:{database_password}@{database_host}:{database_port}/{database_name}"
+# Construct the connection string for the MySQL database using the PyMySQL driver,
+# unless a full DATABASE_URL (e.g. SQLite for local runs) was provided
+DATABASE_URL = Config.DATABASE_URL or f"mysql+pymysql://{database_user}:{database_password}@{database_host}:{database_port}/{database_name}"
 
-# Create the Engine, 'echo=True' makes it log every SQL query to the terminal for Debugging
-engine = create_engine(DATABASE_URL, echo=True)
+
+def make_engine(url: str):
+    # SQLite connections are shared between the event loop and the threadpool
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+    # SQL_ECHO=true makes it log every SQL query to the terminal for Debugging
+    new_engine = create_engine(url, echo=Config.SQL_ECHO, connect_args=connect_args, poolclass=InstrumentedQueuePool)
+
+    # Record query counts/latency and pool wait times for /metrics
+    instrument_engine(new_engine)
+    return new_engine
+
+
+# Create the Engine for the primary (all writes go here)
+engine = make_engine(DATABASE_URL)
 
 # A factory for creating individual database sessions/connections
 SessionLocal = sessionmaker(bind=engine)
@@ -22,11 +40,153 @@ SessionLocal = sessionmaker(bind=engine)
 # The base class that all database table models must inherit from
 Base = declarative_base()
 
-# A generator function (dependency) that opens a database connection for a request 
+
+# Read Replicas --- --- --- --- ---
+
+def replica_lag(replica) -> float | None:
+    """Seconds the replica is behind its source, None when replication is stopped"""
+    with replica.connect() as connection:
+        if replica.dialect.name != "mysql":
+            # Nothing to ask; a reachable database counts as current
+            connection.execute(text("SELECT 1"))
+            return 0.0
+        status = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+        if status is None:
+            return 0.0
+        return status.get("Seconds_Behind_Source")
+
+
+class ReplicaRouter:
+    """
+    Picks the engine for read-only sessions: a replica within the lag budget (round robin),
+    or the primary when there are none, none are healthy, or the caller has just written.
+    """
+
+    def __init__(self, engines: list, max_lag: float, check_interval: float, pin_seconds: float):
+        self.engines = engines
+        self.sessionmakers = [sessionmaker(bind=replica) for replica in engines]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.pin_seconds = pin_seconds
+        self.lag: list[float | None] = [0.0] * len(engines)
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.turn = 0
+        # Read-your-writes: pin key (the signed-in user's id) -> monotonic deadline
+        self.pinned: dict[str, float] = {}
+
+    def pin(self, key: str):
+        now = time.monotonic()
+        if len(self.pinned) > 10_000:
+            self.pinned = {k: until for k, until in self.pinned.items() if until > now}
+        self.pinned[key] = now + self.pin_seconds
+
+    def is_pinned(self, key: str | None) -> bool:
+        until = self.pinned.get(key) if key else None
+        if until is None:
+            return False
+        if until < time.monotonic():
+            self.pinned.pop(key, None)
+            return False
+        return True
+
+    def check_lag(self):
+        """Refresh replica lag at most once per interval; other callers use the last reading"""
+        if time.monotonic() - self.checked_at < self.check_interval or not self.lock.acquire(blocking=False):
+            return
+        try:
+            for index, replica in enumerate(self.engines):
+                try:
+                    self.lag[index] = replica_lag(replica)
+                except Exception as e:
+                    self.lag[index] = None
+                    print(f"Replica {index} unavailable: {e}")
+            self.checked_at = time.monotonic()
+        finally:
+            self.lock.release()
+
+    def replica_session(self, pin_key: str | None = None) -> Session | None:
+        """A session on a healthy replica, None when the read should go to the primary"""
+        if not self.engines or self.is_pinned(pin_key):
+            return None
+
+        self.check_lag()
+        healthy = [i for i, lag in enumerate(self.lag) if lag is not None and lag <= self.max_lag]
+        if not healthy:
+            return None
+
+        self.turn += 1
+        database = self.sessionmakers[healthy[self.turn % len(healthy)]]()
+        database.info["read_only"] = True
+        return database
+
+    def report(self) -> list[dict]:
+        return [
+            {"replica": index, "lag_seconds": lag, "healthy": lag is not None and lag <= self.max_lag}
+            for index, lag in enumerate(self.lag)
+        ]
+
+
+replica_router = ReplicaRouter(
+    [make_engine(url) for url in Config.REPLICA_URLS],
+    max_lag=Config.REPLICA_MAX_LAG_SECONDS,
+    check_interval=Config.REPLICA_CHECK_INTERVAL_SECONDS,
+    pin_seconds=Config.READ_YOUR_WRITES_SECONDS
+)
+
+
+# Read-your-writes: a primary session that committed changes pins its caller to the primary
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "after_bulk_update")
+@event.listens_for(SessionLocal, "after_bulk_delete")
+def _mark_bulk_write(context):
+    if context.result.rowcount:
+        context.session.info["wrote"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def _pin_writer(session):
+    if session.info.pop("wrote", False) and replica_router.engines and session.info.get("pin_key"):
+        replica_router.pin(session.info["pin_key"])
+
+# Replica sessions must never write
+@event.listens_for(Session, "before_flush")
+def _reject_replica_write(session, flush_context, instances):
+    if session.info.get("read_only") and (session.new or session.dirty or session.deleted):
+        raise RuntimeError("Write attempted on a read-replica session, use get_database")
+
+
+def request_pin_key(connection: HTTPConnection) -> str | None:
+    """Read-your-writes key of a request: the signed-in user's id (only needed with replicas)"""
+    access_token = connection.cookies.get("Authorization")
+    if not access_token or not replica_router.engines:
+        return None
+    from .auth import verify_access_token  # app.auth imports this module
+    return verify_access_token(access_token)
+
+
+# A generator function (dependency) that opens a database connection for a request
 # and ensures it is closed once the request is finished.
-def get_database():
+def get_database(connection: HTTPConnection):
     database = SessionLocal()
+    database.info["pin_key"] = request_pin_key(connection)
+    try:
+        yield database
+    finally:
+        database.close()
+
+
+# Same, for read-only routes: served by a replica unless this session wrote recently.
+# Otherwise it is the request's primary session (FastAPI caches get_database per request),
+# so a route depending on both never holds two primary connections.
+def get_read_database(primary: Session = Depends(get_database)):
+    database = replica_router.replica_session(primary.info.get("pin_key"))
+    if database is None:
+        yield primary  # Closed by get_database
+        return
     try:
         yield database
     finally:
-        database.close()
\ No newline at end of file
+        database.close()
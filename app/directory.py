@@ -0,0 +1,92 @@
+"""
+In-memory user directory for typeahead search.
+
+Usernames are kept in a sorted array so a prefix lookup is a single bisect
+followed by a short forward scan, with no LIKE query against the database.
+The directory is built once at startup, updated when a registration completes, and
+refreshed in the background with users registered through other workers.
+"""
+import asyncio, threading
+from bisect import bisect_left, insort
+from sqlalchemy.orm import Session
+from .config import Config
+from .database import SessionLocal
+from .models import User
+
+# Ids can commit out of order, so each refresh re-reads this many ids below the highest seen
+REFRESH_OVERLAP = 1000
+
+
+class UserDirectory:
+    def __init__(self):
+        # Sorted entries: (lowercase username, user id, display username)
+        self.entries: list[tuple[str, int, str]] = []
+        self.ids: set[int] = set()
+        self.max_id = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self, db: Session):
+        """Build the directory from the users table"""
+        rows = db.query(User.id, User.username).all()
+        entries = sorted((username.lower(), user_id, username) for user_id, username in rows)
+        with self.lock:
+            self.entries = entries
+            self.ids = {user_id for user_id, _ in rows}
+            self.max_id = max(self.ids, default=0)
+            self.loaded = True
+
+    def add(self, user_id: int, username: str):
+        """Register a newly created user"""
+        with self.lock:
+            if user_id not in self.ids:
+                self.ids.add(user_id)
+                insort(self.entries, (username.lower(), user_id, username))
+
+    def refresh(self, db: Session) -> int:
+        """Add users created since the last load/refresh (e.g. on other workers), returns how many"""
+        rows = db.query(User.id, User.username).filter(User.id > self.max_id - REFRESH_OVERLAP).all()
+        added = 0
+        for user_id, username in rows:
+            if user_id not in self.ids:
+                self.add(user_id, username)
+                added += 1
+        with self.lock:
+            self.max_id = max(self.max_id, *(user_id for user_id, _ in rows), 0)
+        return added
+
+    def search(self, prefix: str, limit: int = 10, exclude_id: int | None = None) -> list[tuple[int, str]]:
+        """Return up to `limit` (id, username) pairs whose username starts with prefix"""
+        prefix = prefix.lower()
+        matches = []
+        entries = self.entries  # Snapshot, load() swaps the list atomically
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(matches) < limit:
+            key, user_id, username = entries[position]
+            if not key.startswith(prefix):
+                break
+            if user_id != exclude_id:
+                matches.append((user_id, username))
+            position += 1
+        return matches
+
+
+user_directory = UserDirectory()
+
+
+async def run_directory_refresh():
+    """Background loop: keep the directory in step with registrations on other workers"""
+    while True:
+        await asyncio.sleep(Config.DIRECTORY_REFRESH_SECONDS)
+        try:
+            await asyncio.to_thread(_refresh_directory)
+        except Exception as e:
+            print(f"Directory refresh error: {e}")
+
+
+def _refresh_directory():
+    db = SessionLocal()
+    try:
+        user_directory.refresh(db)
+    finally:
+        db.close()
@@ -1,33 +1,107 @@
+import time
+boot_started = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from app.database import engine, Base
-from app.routers import auth_routes, view_routes, chat_routes, user_routes
+from app.config import Config
+from app.database import SessionLocal
+from app.templating import templates, warm_templates
+from app.search import message_search
+from app.directory import user_directory, run_directory_refresh
+from app.archive import run_archiver
+from app.metrics import MetricsMiddleware
+from app.admission import AdmissionMiddleware
+from app.watchdog import loop_watchdog, ProfilerMiddleware
+from app.routers import auth_routes, view_routes, chat_routes, user_routes, channel_routes, attachment_routes, admin_routes
+
+imports_finished = time.perf_counter()
+
+
+def load_indexes():
+    db = SessionLocal()
+    try:
+        message_search.load(db)
+        user_directory.load(db)
+    finally:
+        db.close()
+
+
+# 1. Lifespan: everything with side effects happens here, not at import time.
+# The schema is managed separately with `python -m app.migrate`.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    phases = {"imports": imports_finished - boot_started}
+
+    def timed(name: str, started: float):
+        phases[name] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    Config.validate()
+    timed("config", started)
+
+    started = time.perf_counter()
+    template_count = warm_templates()
+    timed("templates", started)
+
+    # Warm up in-memory indexes (off the loop, the search log replay can take a moment)
+    started = time.perf_counter()
+    await asyncio.to_thread(load_indexes)
+    timed("indexes", started)
+
+    # Background jobs
+    started = time.perf_counter()
+    background_jobs = [
+        asyncio.create_task(run_archiver()),
+        asyncio.create_task(run_directory_refresh()),
+        asyncio.create_task(chat_routes.expire_idle_sockets())
+    ]
+    loop_watchdog.start()
+    timed("background_jobs", started)
+
+    app.state.startup_report = {
+        "total_ms": round((time.perf_counter() - boot_started) * 1000, 1),
+        "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in phases.items()},
+        "templates_compiled": template_count
+    }
+    print(f"--- STARTUP IN {app.state.startup_report['total_ms']}ms: {app.state.startup_report['phases_ms']} ---")
+
+    yield
+
+    # Servers that keep sockets open until lifespan shutdown get a graceful hand-off here;
+    # under uvicorn call POST /admin/drain from the pre-stop hook instead (see admin_routes)
+    await chat_routes.manager.drain(Config.DRAIN_TIMEOUT_SECONDS, Config.RECONNECT_JITTER_MS)
+    loop_watchdog.stop()
+    for job in background_jobs:
+        job.cancel()
 
-# 1. Create Tables
-Base.metadata.create_all(bind=engine)
 
 # 2. Initialize App
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)  # Innermost, so rejected requests still show up in metrics
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
 
-# 3. Mount Static & Templates
+# 3. Mount Static (templates are shared from app/templating.py)
 app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
 
 # 4. Include Routers
 app.include_router(auth_routes.router)
 app.include_router(view_routes.router)
 app.include_router(chat_routes.router)
 app.include_router(user_routes.router)
-
+app.include_router(channel_routes.router)
+app.include_router(attachment_routes.router)
+app.include_router(admin_routes.router)
 
 
 
 
 # Exception Handlers --- --- --- --- ---
-@app.exception_handler(404) 
+@app.exception_handler(404)
 async def not_found_handler(request: Request, exc: Exception):
-    return templates.TemplateResponse("exceptions/404.html", {"request": request}, status_code=404)
+    return templates.TemplateResponse(request, "exceptions/404.html", status_code=404)
 
 @app.exception_handler(405)
 async def method_not_allowed_handler(request: Request, exc: Exception):
@@ -36,6 +110,6 @@ async def method_not_allowed_handler(request: Request, exc: Exception):
     if request.url.path == "/auth/logout":
         # Redirect them back to the dashboard or home
         return auth_routes.RedirectResponse(url="/nexus/dashboard", status_code=303)
-    
+
     # For any other 405, show a custom error page or redirect to home
-    return templates.TemplateResponse("exceptions/405.html", {"request": request}, status_code=405)
\ No newline at end of file
+    return templates.TemplateResponse(request, "exceptions/405.html", status_code=405)
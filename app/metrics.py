@@ -0,0 +1,242 @@
+"""
+Prometheus-style metrics.
+
+Counters, gauges and histograms are plain Python numbers updated without locks:
+the GIL makes each update effectively atomic and an occasional lost increment
+under contention is an acceptable trade for keeping the chat path cheap.
+`render()` produces the Prometheus text exposition format served at /metrics.
+"""
+import time
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Buckets for counts (queries per request, fan-out size)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000)
+
+registry: list["Metric"] = []
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.append(self)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, labels: tuple = ()):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, value in list(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, labels: tuple = ()):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: tuple = ()):
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: tuple = ()):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, (counts, total) in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+# Metric Definitions --- --- --- --- ---
+
+http_request_seconds = Histogram("nexus_http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+db_queries_per_request = Histogram("nexus_db_queries_per_request", "Database queries issued per HTTP request", ("route",), COUNT_BUCKETS)
+db_seconds_per_request = Histogram("nexus_db_seconds_per_request", "Database time spent per HTTP request", ("route",))
+db_query_seconds = Histogram("nexus_db_query_duration_seconds", "Database statement execution time")
+db_pool_wait_seconds = Histogram("nexus_db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+websocket_active = Gauge("nexus_websocket_connections_active", "Currently open chat sockets")
+chat_delivery_seconds = Histogram("nexus_chat_delivery_seconds", "Socket frame ingest to delivery latency")
+broadcast_fanout = Histogram("nexus_broadcast_fanout", "Recipients per broadcast", ("event",), COUNT_BUCKETS)
+ephemeral_signals = Counter("nexus_ephemeral_signals_total", "Ephemeral signals by outcome", ("kind", "outcome"))
+event_loop_lag_seconds = Histogram("nexus_event_loop_lag_seconds", "How late event loop heartbeats wake up")
+event_loop_stalls = Counter("nexus_event_loop_stalls_total", "Times the event loop was blocked beyond the watchdog threshold")
+password_hash_seconds = Histogram("nexus_password_hash_seconds", "bcrypt hash/verify time", ("operation",))
+db_queries_per_frame = Histogram("nexus_db_queries_per_frame", "Database queries issued per socket frame", ("frame",), COUNT_BUCKETS)
+db_seconds_per_frame = Histogram("nexus_db_seconds_per_frame", "Database time spent per socket frame", ("frame",))
+admission_in_flight = Gauge("nexus_admission_in_flight", "Work currently admitted per lane", ("lane",))
+admission_wait_seconds = Histogram("nexus_admission_wait_seconds", "Time spent queueing for a lane", ("lane",))
+admission_rejected = Counter("nexus_admission_rejected_total", "Requests answered 503 because their lane was over budget", ("lane",))
+repeated_statements = Counter("nexus_db_repeated_statements_total", "Requests/frames that ran one statement repeatedly (likely N+1)", ("kind", "name"))
+
+
+# Database Instrumentation --- --- --- --- ---
+
+# Identical statements run this many times within one request or frame are flagged as N+1 suspects
+REPEATED_STATEMENT_THRESHOLD = 3
+
+
+class QueryStats:
+    """Statements executed within one HTTP request or socket frame"""
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # SQL text (parameters are bound separately, so N+1 loops repeat the same text) -> executions
+        self.statements: dict[str, int] = {}
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        self.statements[statement] = self.statements.get(statement, 0) + 1
+
+    def repeated(self, threshold: int = REPEATED_STATEMENT_THRESHOLD) -> dict[str, int]:
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+
+# Stats for the request or frame being served, if any
+request_db_stats: ContextVar[QueryStats | None] = ContextVar("request_db_stats", default=None)
+
+# Called with (kind, name, stats) when a request or frame finishes; used by app/queries.py
+query_listeners: list = []
+# Recent N+1 suspects for /admin/queries; each (name, statement) is only logged once
+recent_repeats: deque[dict] = deque(maxlen=50)
+_reported_repeats: set[tuple[str, str]] = set()
+
+
+def finish_query_stats(kind: str, name: str, stats: QueryStats):
+    for listener in query_listeners:
+        listener(kind, name, stats)
+
+    repeated = stats.repeated()
+    if not repeated:
+        return
+    repeated_statements.inc(labels=(kind, name))
+    for statement, count in repeated.items():
+        recent_repeats.append({"kind": kind, "name": name, "count": count, "statement": statement})
+        if (name, statement) not in _reported_repeats:
+            _reported_repeats.add((name, statement))
+            print(f"Repeated query ({count}x) in {kind} {name}: {' '.join(statement.split())[:300]}")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """Time every statement and attribute it to the current request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_start
+        db_query_seconds.observe(elapsed)
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+
+# HTTP Instrumentation --- --- --- --- ---
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency and query counts per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        stats = QueryStats()
+        token = request_db_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_db_stats.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_seconds.observe(elapsed, (scope["method"], route, status[0]))
+            db_queries_per_request.observe(stats.count, (route,))
+            db_seconds_per_request.observe(stats.seconds, (route,))
+            finish_query_stats("http", f"{scope['method']} {route}", stats)
+
+
+def record_frame_queries(frame_type: str, stats: QueryStats):
+    """Per-frame counterpart of the middleware, called by the socket loop"""
+    db_queries_per_frame.observe(stats.count, (frame_type,))
+    db_seconds_per_frame.observe(stats.seconds, (frame_type,))
+    finish_query_stats("frame", f"frame {frame_type}", stats)
@@ -0,0 +1,59 @@
+"""
+Explicit schema management step, run before starting (or upgrading) workers:
+
+    python -m app.migrate
+
+Creates any missing tables and indexes, adds new nullable columns to existing tables
+and repairs data the new constraints depend on. The app itself no longer touches the schema on import, so worker boot stays
+fast and side-effect free.
+"""
+from sqlalchemy import inspect, text
+from .database import engine, Base, SessionLocal
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+from .archive import repair_archives
+
+
+def add_missing_columns():
+    """ALTER existing tables for nullable columns added to the models since they were created"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NULL"))
+                print(f"--- ADDED COLUMN {table.name}.{column.name} ---")
+
+
+def add_missing_indexes():
+    """create_all only indexes new tables; add indexes declared since a table was created"""
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name in existing_tables:
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+
+
+def migrate():
+    add_missing_columns()
+    if "message_archives" in inspect(engine).get_table_names():
+        db = SessionLocal()
+        try:
+            repaired = repair_archives(db)
+            if repaired:
+                print(f"--- REPAIRED {repaired} MESSAGE ARCHIVES ---")
+        finally:
+            db.close()
+    add_missing_indexes()
+    Base.metadata.create_all(bind=engine)
+
+
+if __name__ == "__main__":
+    migrate()
+    print(f"--- SCHEMA UP TO DATE ({engine.url.render_as_string(hide_password=True)}) ---")
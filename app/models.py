@@ -1,5 +1,24 @@
 from .database import Base
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, func, text, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, Index, LargeBinary, func, ForeignKey
+from sqlalchemy.dialects import mysql
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+
+
+class utc_now(FunctionElement):
+    """Server-side UTC timestamp that renders correctly for each database dialect"""
+    type = DateTime()
+    inherit_cache = True
+
+@compiles(utc_now)
+def _utc_now_default(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "(CURRENT_TIMESTAMP)"
+
+@compiles(utc_now, "mysql")
+def _utc_now_mysql(element, compiler, **kw):
+    return "(UTC_TIMESTAMP())"
+
 
 class User(Base):
     __tablename__ = "users"
@@ -16,11 +35,80 @@ class Message(Base):
     sender_id = Column(Integer, ForeignKey("users.id"))
     receiver_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text, nullable=False)
-    timestamp = Column(DateTime, server_default=text("(UTC_TIMESTAMP())"))
+    timestamp = Column(DateTime, server_default=utc_now())
     is_read = Column(Boolean, default=False)
+    attachment_sha256 = Column(String(64), ForeignKey("attachments.sha256"), nullable=True)
 
+    __table_args__ = (
+        # Backs message search on MySQL; other databases use the local index in app/search.py
+        Index("ix_messages_content_fulltext", "content", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
     
 
+class Attachment(Base):
+    """An uploaded file, stored once on disk under its SHA-256 (see app/attachments.py)"""
+    __tablename__ = "attachments"
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, index=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=False)
+    uploaded_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, server_default=utc_now())
+
+class MessageArchive(Base):
+    """Cold messages of one conversation for one month, stored as a single compressed blob"""
+    __tablename__ = "message_archives"
+    id = Column(Integer, primary_key=True, index=True)
+    # Conversation participants, lower user id first
+    user_low_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_high_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    period = Column(String(7), nullable=False) # "YYYY-MM"
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary().with_variant(mysql.LONGBLOB(), "mysql"), nullable=False) # zlib-compressed JSON rows
+    # Distinct words of every message in the blob, so FULLTEXT search can find archived messages
+    search_terms = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=utc_now())
+
+    __table_args__ = (
+        Index("ix_message_archives_conversation", "user_low_id", "user_high_id", "last_message_id"),
+        # One blob per conversation-month; concurrent archivers upsert into it
+        Index("ux_message_archives_conversation_period", "user_low_id", "user_high_id", "period", unique=True),
+        Index("ix_message_archives_search_terms_fulltext", "search_terms", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
+
+class Channel(Base):
+    """A group conversation"""
+    __tablename__ = "channels"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(DateTime, server_default=utc_now())
+
+class ChannelMember(Base):
+    """Channel membership with a per-member read cursor (replaces per-row is_read for groups)"""
+    __tablename__ = "channel_members"
+    channel_id = Column(Integer, ForeignKey("channels.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
+    last_read_message_id = Column(Integer, nullable=False, default=0)
+    joined_at = Column(DateTime, server_default=utc_now())
+
+class ChannelMessage(Base):
+    """A group message, stored once regardless of how many members receive it"""
+    __tablename__ = "channel_messages"
+    id = Column(Integer, primary_key=True, index=True)
+    channel_id = Column(Integer, ForeignKey("channels.id", ondelete="CASCADE"), nullable=False)
+    sender_id = Column(Integer, ForeignKey("users.id"))
+    content = Column(Text, nullable=False)
+    timestamp = Column(DateTime, server_default=utc_now())
+    attachment_sha256 = Column(String(64), ForeignKey("attachments.sha256"), nullable=True)
+
+    __table_args__ = (
+        # History paging and unread counts both walk one channel in id order
+        Index("ix_channel_messages_channel_id_id", "channel_id", "id"),
+    )
+
 class PendingUser(Base):
     __tablename__ = "pending_users"
     id = Column(Integer, primary_key=True, index=True)
@@ -28,7 +116,7 @@ class PendingUser(Base):
     email = Column(String(100), nullable=False)
     password = Column(String(200), nullable=False) # Hashed
     otp_code = Column(String(20), nullable=False)
-    created_at = Column(DateTime, server_default=text("(UTC_TIMESTAMP())"))
+    created_at = Column(DateTime, server_default=utc_now())
     isVerified = Column(Boolean, default=False, nullable=False)
 
 class PasswordResetToken(Base):
@@ -38,4 +126,4 @@ class PasswordResetToken(Base):
     email = Column(String(255), index=True)
     token = Column(String(255), unique=True, index=True)
     expires_at = Column(DateTime)
-    created_at = Column(DateTime, server_default=text("(UTC_TIMESTAMP())"))
+    created_at = Column(DateTime, server_default=utc_now())
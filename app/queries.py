@@ -0,0 +1,95 @@
+"""
+Query budgets.
+
+The metrics layer counts every statement per HTTP request and per socket frame
+(app/metrics.py). These helpers turn those counts into assertions, so a change that
+adds queries to a route (an N+1 loop, a duplicate lookup) fails loudly instead of
+merging unnoticed:
+
+    with query_budget("GET /api/users", max_queries=1):
+        client.get("/api/users")
+
+ROUTE_BUDGETS holds the agreed budget for the hot routes, DIALECT_BUDGETS the overrides
+for routes whose code path depends on the database (message search). `python -m
+bench.query_budget` checks all of them against a scratch SQLite database, or against
+the database given with --database-url (e.g. an empty MySQL schema).
+"""
+from contextlib import contextmanager
+from .database import engine
+from .metrics import QueryStats, query_listeners
+
+# "<METHOD> <route template>" or "frame <type>" -> maximum statements per request/frame
+ROUTE_BUDGETS = {
+    "GET /nexus/dashboard": 1,
+    "GET /nexus/chat/dm/{receiver_id}": 4,
+    "GET /api/users": 1,
+    "GET /api/users/search": 0,
+    "GET /api/messages/{receiver_id}": 3,
+    "GET /api/search/messages": 2,
+    "GET /api/channels": 1,
+    "GET /api/channels/{channel_id}/messages": 3,
+    "frame chat": 3,
+    "frame channel_chat": 3,
+    "frame typing": 0,
+    "frame heartbeat": 0,
+}
+
+# Dialect -> overrides. MySQL searches through FULLTEXT: a count, the hot ids and the
+# matching archive blobs, then the page is loaded (plus archived rows when the page has any)
+DIALECT_BUDGETS = {
+    "mysql": {"GET /api/search/messages": 5},
+}
+
+
+def route_budget(name: str, dialect: str | None = None) -> int | None:
+    """Budget for `name` on `dialect` (default: the configured database), None if it has none"""
+    overrides = DIALECT_BUDGETS.get(dialect or engine.dialect.name, {})
+    return overrides.get(name, ROUTE_BUDGETS.get(name))
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def capture_queries():
+    """Collect (kind, name, stats) for every request and frame that finishes inside the block"""
+    captured: list[tuple[str, str, QueryStats]] = []
+
+    def listener(kind: str, name: str, stats: QueryStats):
+        captured.append((kind, name, stats))
+
+    query_listeners.append(listener)
+    try:
+        yield captured
+    finally:
+        query_listeners.remove(listener)
+
+
+def check_budget(name: str, stats: QueryStats, max_queries: int | None = None, allow_repeats: bool = False):
+    """Raise QueryBudgetExceeded if `stats` is over budget or repeats a statement"""
+    max_queries = route_budget(name) if max_queries is None else max_queries
+    if max_queries is not None and stats.count > max_queries:
+        statements = "\n".join(f"  {count}x {statement}" for statement, count in stats.statements.items())
+        raise QueryBudgetExceeded(f"{name} ran {stats.count} queries (budget {max_queries}):\n{statements}")
+
+    repeated = stats.repeated(threshold=2)
+    if repeated and not allow_repeats:
+        statements = "\n".join(f"  {count}x {statement}" for statement, count in repeated.items())
+        raise QueryBudgetExceeded(f"{name} repeated statements:\n{statements}")
+
+
+@contextmanager
+def query_budget(name: str, max_queries: int | None = None, allow_repeats: bool = False):
+    """
+    Assert that every request/frame called `name` finishing inside the block stays within
+    budget (route_budget(name) unless `max_queries` is given) and runs no statement twice.
+    """
+    with capture_queries() as captured:
+        yield captured
+
+    matched = [stats for _, finished, stats in captured if finished == name]
+    if not matched:
+        raise QueryBudgetExceeded(f"No request or frame named {name!r} finished (saw {[n for _, n, _ in captured]})")
+    for stats in matched:
+        check_budget(name, stats, max_queries, allow_repeats)
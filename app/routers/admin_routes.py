@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Header, HTTPException, Depends, Request
+from fastapi.responses import PlainTextResponse
+from typing import Annotated
+from app import metrics
+from app.config import Config
+from app.database import replica_router
+from app.admission import lanes
+from app.watchdog import loop_watchdog, recent_profiles
+from app.routers.chat_routes import manager
+
+router = APIRouter(tags=["Operations"])
+
+
+def require_admin(admin_token: Annotated[str | None, Header(alias="X-Admin-Token")] = None):
+    """Admin endpoints only exist when ADMIN_TOKEN is configured and presented"""
+    if not Config.ADMIN_TOKEN or admin_token != Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def show_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.post("/admin/drain", dependencies=[Depends(require_admin)])
+async def drain_sockets():
+    """
+    Put this worker in drain mode before it is stopped (call from the deploy pre-stop hook):
+    new sockets are refused and connected clients are told to reconnect with jitter.
+    """
+    closed = await manager.drain(Config.DRAIN_TIMEOUT_SECONDS, Config.RECONNECT_JITTER_MS)
+    return {"draining": True, "closed": closed}
+
+
+@router.get("/admin/loop-lag", dependencies=[Depends(require_admin)])
+async def show_loop_lag():
+    """Current event loop lag and the stacks captured while it was blocked"""
+    return loop_watchdog.report()
+
+
+@router.get("/admin/lanes", dependencies=[Depends(require_admin)])
+async def show_lanes():
+    """Admission lanes: limits, current load and queue depth"""
+    return {name: lane.report() for name, lane in lanes.items()}
+
+
+@router.get("/admin/queries", dependencies=[Depends(require_admin)])
+async def show_repeated_queries():
+    """Requests and socket frames that recently ran the same statement repeatedly (N+1 suspects)"""
+    return list(metrics.recent_repeats)
+
+
+@router.get("/admin/replicas", dependencies=[Depends(require_admin)])
+async def show_replicas():
+    """Last measured lag per read replica and whether reads are being routed to it"""
+    return replica_router.report()
+
+
+@router.get("/admin/startup", dependencies=[Depends(require_admin)])
+async def show_startup_report(request: Request):
+    """How long this worker took to boot, by phase"""
+    return request.app.state.startup_report
+
+
+@router.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """Recently profiled requests (send X-Nexus-Profile: <ADMIN_TOKEN> to profile one)"""
+    return [
+        {"id": p["id"], "path": p["path"], "duration_ms": p["duration_ms"], "samples": p["samples"]}
+        for p in recent_profiles
+    ]
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def show_profile(profile_id: str):
+    for profile in recent_profiles:
+        if profile["id"] == profile_id:
+            return profile
+    raise HTTPException(status_code=404, detail="Profile not found")
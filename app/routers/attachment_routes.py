@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, Cookie, Request, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from typing import Annotated
+from app.database import get_database
+from app.auth import require_user_id
+from app.models import Attachment
+from app.attachments import receive_upload, get_or_create_attachment, attachment_path, ensure_thumbnail, is_sha256
+from app.schemas import AttachmentOut
+from app.serialization import FastJSONResponse
+
+router = APIRouter(prefix="/api/attachments", tags=["Attachments"], default_response_class=FastJSONResponse)
+
+# Content never changes for a given hash
+IMMUTABLE_CACHE = "private, max-age=31536000, immutable"
+
+# Only raster images are rendered inline; anything else (HTML, SVG, scripts...) could run
+# on our origin, so it is downloaded as opaque bytes
+INLINE_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+
+
+def download_headers(sha256: str, inline: bool) -> dict:
+    headers = {"Cache-Control": IMMUTABLE_CACHE, "ETag": f'"{sha256}"', "X-Content-Type-Options": "nosniff"}
+    if not inline:
+        headers["Content-Disposition"] = f'attachment; filename="{sha256}"'
+    return headers
+
+
+@router.post("", response_model=AttachmentOut, status_code=201)
+async def upload_attachment(
+    request: Request,
+    db: Session = Depends(get_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    """Upload a file as the raw request body (not multipart); the body is streamed to disk"""
+    current_user_id = require_user_id(access_token)
+
+    sha256, size = await receive_upload(request)
+    content_type = request.headers.get("content-type") or "application/octet-stream"
+    attachment = await run_in_threadpool(get_or_create_attachment, db, sha256, size, content_type, current_user_id)
+
+    return FastJSONResponse({
+        "sha256": attachment.sha256,
+        "size": attachment.size,
+        "content_type": attachment.content_type,
+        "url": f"/api/attachments/{attachment.sha256}"
+    }, status_code=201)
+
+
+def get_attachment_or_404(db: Session, sha256: str) -> Attachment:
+    attachment = db.query(Attachment).filter(Attachment.sha256 == sha256).first() if is_sha256(sha256) else None
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return attachment
+
+
+@router.get("/{sha256}")
+def download_attachment(
+    sha256: str,
+    db: Session = Depends(get_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    """Serve the stored file; FileResponse handles Range requests and zero-copy sends"""
+    require_user_id(access_token)
+    attachment = get_attachment_or_404(db, sha256)
+    inline = attachment.content_type in INLINE_TYPES
+
+    return FileResponse(
+        attachment_path(sha256),
+        media_type=attachment.content_type if inline else "application/octet-stream",
+        headers=download_headers(sha256, inline)
+    )
+
+
+@router.get("/{sha256}/thumbnail")
+async def download_thumbnail(
+    sha256: str,
+    db: Session = Depends(get_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    require_user_id(access_token)
+    attachment = await run_in_threadpool(get_attachment_or_404, db, sha256)
+    if attachment.content_type not in INLINE_TYPES:
+        raise HTTPException(status_code=404, detail="No thumbnail for this attachment")
+
+    path = await ensure_thumbnail(sha256)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No thumbnail for this attachment")
+
+    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": IMMUTABLE_CACHE, "X-Content-Type-Options": "nosniff"})
@@ -3,23 +3,19 @@ from app.database import Session, get_database
 from app.schemas import UserOut, UserCreate, RequestLogin, VerifyOtp, RequestRecoverAccessKey, ResetAccessKey
 from app.models import User, PendingUser, PasswordResetToken
 from typing import Annotated
-from app.utils import hash_password, generate_otp, hash_token, verify_password, generate_reset_token
+from app.utils import hash_password, hash_password_async, generate_otp, hash_token, verify_password, generate_reset_token
 from app.auth import create_access_token, timedelta, timezone, datetime, verify_access_token
 from itsdangerous import URLSafeSerializer
 from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 from app.config import Config
+from app.directory import user_directory
+from app.templating import templates
 
 
 # Initialize serializer for secure cookie signing
 serializer = URLSafeSerializer(Config.SECRET_KEY)
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-# Setup templates and static files
-templates = Jinja2Templates(directory="templates")
-router.mount("/static", StaticFiles(directory="static"), name="static")
-
 
 
 
@@ -28,8 +24,7 @@ router.mount("/static", StaticFiles(directory="static"), name="static")
 @router.get("/signup", response_class=HTMLResponse)
 async def show_signup_page(request: Request, error: str = Cookie(None, alias="error")):
     """Render the signup page with any stored error messages"""
-    response = templates.TemplateResponse("auth/signup.html", {
-        "request": request,
+    response = templates.TemplateResponse(request, "auth/signup.html", {
         "error": error
     })
     response.delete_cookie(key="error")  # Clear after displaying
@@ -48,8 +43,7 @@ async def show_login_page(
         user_id = verify_access_token(access_token)
         if user_id:
             return RedirectResponse("/nexus/dashboard")
-    response = templates.TemplateResponse("auth/login.html", {
-        "request": request,
+    response = templates.TemplateResponse(request, "auth/login.html", {
         "error": error,
         "success_msg": success_msg
     })
@@ -76,8 +70,7 @@ async def show_otp_page(
     if not pending_email and error is None:
         return RedirectResponse(url="/auth/signup", status_code=303)
 
-    response = templates.TemplateResponse("auth/verify-otp.html", {
-        "request": request,
+    response = templates.TemplateResponse(request, "auth/verify-otp.html", {
         "error": error
     })
     
@@ -92,8 +85,8 @@ async def show_recover_password_page(
     message: str | None = Cookie(alias="response", default=None) 
 ):
     """Display password recovery form with status message"""
-    context = {"request": request, "message": message}
-    response = templates.TemplateResponse("auth/forgot-password.html", context)
+    context = {"message": message}
+    response = templates.TemplateResponse(request, "auth/forgot-password.html", context)
     
     if message:
         response.delete_cookie(key="response")  # One-time message
@@ -120,15 +113,13 @@ async def show_password_reset_page(
 
     if resetRequest:
         # Valid token - show reset form
-        return templates.TemplateResponse("auth/password-reset.html", {
-            "request": request, 
+        return templates.TemplateResponse(request, "auth/password-reset.html", {
             "error": None,
             "token": token,  # Pass token back for form submission
         })
     else:
         # Invalid/expired token
-        return templates.TemplateResponse("auth/password-reset.html", {
-            "request": request, 
+        return templates.TemplateResponse(request, "auth/password-reset.html", {
             "error": "This link has expired or is invalid. Please request a new one.",
             "token": None
         })
@@ -292,8 +283,13 @@ async def verify_otp(
         )
         db.add(register_user)
         db.delete(pending_user)  # Clean up pending record
+        db.flush()
+        # Not signed in yet, so pin the new user explicitly: the dashboard redirect must
+        # read their row from the primary, not from a replica that may not have it
+        db.info["pin_key"] = str(register_user.id)
         db.commit()
         db.refresh(register_user)
+        user_directory.add(register_user.id, register_user.username)
 
         # Issue access token for immediate login
         access_token = create_access_token({"sub": str(register_user.id)})
@@ -406,7 +402,7 @@ async def reset_password(
         if not user:
             raise HTTPException(status_code=404, detail="User not found.")
 
-        user.password = hash_password(incoming_credential.new_password)
+        user.password = await hash_password_async(incoming_credential.new_password)
         
         # Delete used token (one-time use)
         db.delete(reset_request)
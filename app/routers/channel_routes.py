@@ -0,0 +1,123 @@
+from fastapi import APIRouter, Depends, Cookie, Query, HTTPException
+from sqlalchemy.orm import Session
+from typing import Annotated
+from app.database import get_database, get_read_database
+from app.auth import require_user_id
+from app.models import User, ChannelMember, ChannelMessage
+from app.channels import channel_registry, create_channel, channels_with_unread, advance_read_cursor
+from app.schemas import ChannelCreate, ChannelMemberAdd, ChannelReadCursor, ChannelOut, ChannelMessageOut
+from app.serialization import FastJSONResponse
+
+router = APIRouter(prefix="/api/channels", tags=["Channels"], default_response_class=FastJSONResponse)
+
+
+def require_member(db: Session, channel_id: int, user_id: int):
+    if not channel_registry.is_member(db, channel_id, user_id):
+        raise HTTPException(status_code=404, detail="Channel not found")
+
+
+@router.post("", response_model=ChannelOut, status_code=201)
+def create_group_channel(
+    data: ChannelCreate,
+    db: Session = Depends(get_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    """Create a channel with the caller and the given users as members"""
+    current_user_id = require_user_id(access_token)
+
+    member_ids = {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(data.member_ids)).all()}
+    channel = create_channel(db, data.name, current_user_id, list(member_ids))
+    channel_registry.set_members(channel.id, {current_user_id, *member_ids})
+
+    return FastJSONResponse({"id": channel.id, "name": channel.name, "unread_count": 0}, status_code=201)
+
+
+@router.get("", response_model=list[ChannelOut])
+def list_channels(db: Session = Depends(get_read_database), access_token: Annotated[str | None, Cookie(alias="Authorization")] = None):
+    """Channels the caller belongs to, with unread counts from their read cursor"""
+    current_user_id = require_user_id(access_token)
+
+    return FastJSONResponse([
+        {"id": channel_id, "name": name, "unread_count": unread_count}
+        for channel_id, name, unread_count in channels_with_unread(db, current_user_id)
+    ])
+
+
+@router.post("/{channel_id}/members", status_code=204)
+def add_channel_member(
+    channel_id: int,
+    data: ChannelMemberAdd,
+    db: Session = Depends(get_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    current_user_id = require_user_id(access_token)
+    require_member(db, channel_id, current_user_id)
+
+    if not db.get(User, data.user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if not channel_registry.is_member(db, channel_id, data.user_id):
+        # New members start with everything already sent marked as read
+        latest = db.query(ChannelMessage.id).filter(ChannelMessage.channel_id == channel_id) \
+            .order_by(ChannelMessage.id.desc()).limit(1).scalar() or 0
+        db.add(ChannelMember(channel_id=channel_id, user_id=data.user_id, last_read_message_id=latest))
+        db.commit()
+        channel_registry.add_member(channel_id, data.user_id)
+
+
+@router.delete("/{channel_id}/members/me", status_code=204)
+def leave_channel(channel_id: int, db: Session = Depends(get_database), access_token: Annotated[str | None, Cookie(alias="Authorization")] = None):
+    current_user_id = require_user_id(access_token)
+    require_member(db, channel_id, current_user_id)
+
+    db.query(ChannelMember).filter(
+        ChannelMember.channel_id == channel_id,
+        ChannelMember.user_id == current_user_id
+    ).delete(synchronize_session=False)
+    db.commit()
+    channel_registry.remove_member(channel_id, current_user_id)
+
+
+@router.get("/{channel_id}/messages", response_model=list[ChannelMessageOut])
+def get_channel_history(
+    channel_id: int,
+    before: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+    db: Session = Depends(get_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    """Newest page of channel messages older than `before`, ascending; advances the read cursor"""
+    current_user_id = require_user_id(access_token)
+    require_member(db, channel_id, current_user_id)
+
+    query = db.query(
+        ChannelMessage.id, ChannelMessage.sender_id, ChannelMessage.content, ChannelMessage.timestamp,
+        ChannelMessage.attachment_sha256
+    ).filter(ChannelMessage.channel_id == channel_id)
+    if before is not None:
+        query = query.filter(ChannelMessage.id < before)
+    rows = query.order_by(ChannelMessage.id.desc()).limit(limit).all()
+    rows.reverse()
+
+    if rows and before is None:
+        advance_read_cursor(db, channel_id, current_user_id, rows[-1].id)
+
+    return FastJSONResponse([
+        {
+            "id": m.id, "channel_id": channel_id, "sender_id": m.sender_id, "content": m.content,
+            "timestamp": m.timestamp, "attachment": m.attachment_sha256
+        }
+        for m in rows
+    ])
+
+
+@router.post("/{channel_id}/read", status_code=204)
+def mark_channel_read(
+    channel_id: int,
+    data: ChannelReadCursor,
+    db: Session = Depends(get_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    current_user_id = require_user_id(access_token)
+    require_member(db, channel_id, current_user_id)
+    advance_read_cursor(db, channel_id, current_user_id, data.message_id)
@@ -1,9 +1,18 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.orm import Session
+from app.config import Config
 from app.database import get_database
 from app.models import func
-from app.models import Message
-import json, datetime
+from app.models import Message, ChannelMessage
+from app.channels import channel_registry, online_members, fan_out
+from app.search import message_search
+from app.attachments import attachment_exists, is_sha256
+from app.metrics import websocket_active, chat_delivery_seconds, broadcast_fanout, ephemeral_signals
+from app.metrics import QueryStats, request_db_stats, record_frame_queries
+from app.signals import signal_throttle
+from app.serialization import dumps_text, loads
+from app.admission import run_realtime
+import asyncio, datetime, random, time
 
 router = APIRouter()
 
@@ -11,94 +20,445 @@ class ConnectionManager:
     def __init__(self):
         # Store active connections: {user_id: websocket_object}
         self.active_connections: dict[int, WebSocket] = {}
+        # Sends currently in flight per user, used to drop ephemeral frames under backpressure
+        self.pending_sends: dict[int, int] = {}
+        # Last frame (any type, heartbeats included) per user, monotonic seconds; idle sockets are closed
+        self.last_seen: dict[int, float] = {}
+        # Offline broadcasts waiting out the presence grace period
+        self.pending_offline: dict[int, asyncio.TimerHandle] = {}
+        # Frame handlers currently running; a drain waits for their writes to finish
+        self.in_flight = 0
+        # Set once the worker starts shutting down: no new sockets are accepted
+        self.draining = False
 
     async def connect(self, user_id: int, websocket: WebSocket):
         await websocket.accept()
         self.active_connections[user_id] = websocket
+        self.last_seen[user_id] = time.monotonic()
+        websocket_active.set(len(self.active_connections))
 
-    async def disconnect(self, user_id: int):
+    async def disconnect(self, user_id: int, websocket: WebSocket | None = None):
+        # A reconnect may already have replaced this socket; leave the new one alone
+        if websocket is not None and self.active_connections.get(user_id) is not websocket:
+            return
         if user_id in self.active_connections:
             del self.active_connections[user_id]
+        self.pending_sends.pop(user_id, None)
+        self.last_seen.pop(user_id, None)
+        websocket_active.set(len(self.active_connections))
 
-    async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_json(message)
+    async def send_personal_message(self, message: dict, user_id: int) -> bool:
+        return await self.deliver(dumps_text(message), user_id)
+
+    async def deliver(self, frame: str, user_id: int) -> bool:
+        """
+        Best-effort send to a user's socket. A socket that is closing is dropped from the
+        registry instead of raising into the sender's handler. Returns whether it was sent.
+        """
+        websocket = self.active_connections.get(user_id)
+        if websocket is None:
+            return False
+        try:
+            await self.send_text(websocket, frame, user_id)
+        except Exception:
+            # Their own receive loop sees the close as well and finishes the cleanup
+            await self.disconnect(user_id, websocket)
+            return False
+        return True
+
+    async def send_text(self, websocket: WebSocket, frame: str, user_id: int):
+        self.pending_sends[user_id] = self.pending_sends.get(user_id, 0) + 1
+        try:
+            await websocket.send_text(frame)
+        finally:
+            # The entry is gone if the user disconnected meanwhile
+            if self.pending_sends.get(user_id, 0) > 0:
+                self.pending_sends[user_id] -= 1
+
+    def send_ephemeral(self, frame: str, user_id: int, droppable: bool = True) -> bool:
+        """
+        Fire-and-forget send for signals: skipped when the user is offline or, if
+        `droppable`, when a previous send to them has not finished yet. Returns whether it was sent.
+        """
+        websocket = self.active_connections.get(user_id)
+        if websocket is None or (droppable and self.pending_sends.get(user_id, 0)):
+            return False
+        task = asyncio.create_task(self.send_text(websocket, frame, user_id))
+        task.add_done_callback(_ignore_send_error)
+        return True
 
     def get_online_users(self):
         return list(self.active_connections.keys())
 
+    async def drain(self, timeout: float, jitter_ms: int) -> int:
+        """
+        Hand sockets off before shutdown: refuse new ones, tell each client when to
+        reconnect (spread over `jitter_ms`), let in-flight frames finish their writes,
+        then close with 1012 (service restart). Returns the number of sockets closed.
+        """
+        if self.draining:
+            return 0
+        self.draining = True
+        # Users on this worker are coming back elsewhere; don't announce them offline
+        for timer in self.pending_offline.values():
+            timer.cancel()
+        self.pending_offline.clear()
+
+        # The whole hand-off shares one budget: a client that stopped reading can't hold it up
+        deadline = time.monotonic() + timeout
+        connections = list(self.active_connections.items())
+        notified = await _until(deadline, asyncio.gather(*(
+            self.send_text(websocket, dumps_text({"type": "reconnect", "after_ms": random.randint(0, jitter_ms)}), user_id)
+            for user_id, websocket in connections
+        ), return_exceptions=True))
+
+        while self.in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        closed = await _until(deadline, asyncio.gather(
+            *(websocket.close(code=1012) for _, websocket in connections), return_exceptions=True
+        ))
+        if not (notified and closed):
+            print(f"--- DRAIN TIMED OUT AFTER {timeout}s, SLOW SOCKETS CLOSE WITH THE PROCESS ---")
+        print(f"--- DRAINED {len(connections)} SOCKETS ---")
+        return len(connections)
+
+async def _until(deadline: float, awaitable) -> bool:
+    """Await `awaitable` until the monotonic deadline, then cancel it. Returns whether it finished."""
+    try:
+        await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+def _ignore_send_error(task: asyncio.Task):
+    # A failed signal send just means the socket is closing; the receive loop cleans up
+    if not task.cancelled():
+        task.exception()
+
 manager = ConnectionManager()
 
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: int, db: Session = Depends(get_database)):
+    if manager.draining:
+        # Shutting down: accept first so the client sees 1012 (service restart) rather than
+        # a failed handshake, and retries against another worker
+        await websocket.accept()
+        await websocket.close(code=1012)
+        return
+
     await manager.connect(user_id, websocket)
-    # Broadcast to all other users that this user is online
-    await broadcast_user_status(user_id, True)
+    # Broadcast to all other users that this user is online (unless they were only briefly away)
+    if not cancel_offline_broadcast(user_id):
+        await broadcast_user_status(user_id, True)
 
     try:
         while True:
             # Receive data from the client
             data = await websocket.receive_text()
-            message_data = json.loads(data) # Expecting {"receiver_id": 2, "content": "Hi!"}
-            
-            # 1. Save to MySQL db
-            new_message = Message(
-                sender_id=user_id,
-                receiver_id=int(message_data["receiver_id"]),
-                content=message_data["content"]
-            )
-            db.add(new_message)
-            db.commit()
-            db.refresh(new_message)
-
-            # Get unread counts
-            unread_count = db.query(func.count(Message.id)).filter(
-                Message.sender_id == user_id,
-                Message.receiver_id == message_data["receiver_id"],
-                Message.is_read == False
-            ).scalar()
-
-
-            # prepare response
-            receiver_id = int(message_data["receiver_id"])
-            receiver_message = {
-                "type": "chat",
-                "sender_id": user_id,
-                "content": message_data["content"],
-                "timestamp": new_message.timestamp.isoformat(),
-                "message_id": new_message.id,
-                "unread_count": unread_count
-            }
-
-            
-            # 2. Push to the receiver
-            await manager.send_personal_message(receiver_message, receiver_id)
-
-            # 3. Also send to sender (for confirmation with DB timestamp)
-            sender_message = receiver_message.copy()
-            sender_message["type"] = "message_sent"
-            await manager.send_personal_message(sender_message, user_id)
+            received_at = time.perf_counter()
+            manager.last_seen[user_id] = time.monotonic()
+            try:
+                message_data = loads(data) # Expecting {"type": "chat", "receiver_id": 2, "content": "Hi!"}
+            except ValueError:
+                message_data = None
+            if not isinstance(message_data, dict):
+                await manager.send_personal_message({"type": "error", "detail": "Frames must be JSON objects"}, user_id)
+                continue
+
+            # Route by frame type; untyped frames are chat messages (group ones carry a channel_id)
+            frame_type = message_data.get("type") or ("channel_chat" if "channel_id" in message_data else "chat")
+            handler = FRAME_HANDLERS.get(frame_type) if isinstance(frame_type, str) else None
+            if handler is None:
+                await manager.send_personal_message({"type": "error", "detail": f"Unknown frame type: {frame_type}"}, user_id)
+                continue
+            # Queries are accounted per frame, like the metrics middleware does per request
+            stats = QueryStats()
+            token = request_db_stats.set(stats)
+            manager.in_flight += 1
+            try:
+                # Database work inside the handler goes through the realtime lane (run_realtime)
+                await handler(db, user_id, message_data, received_at)
+            except (KeyError, TypeError, ValueError):
+                # Missing or mistyped fields fail this frame only, not the connection
+                await manager.send_personal_message({
+                    "type": "error",
+                    "detail": f"Malformed {frame_type} frame",
+                    "tempId": message_data.get("tempId")
+                }, user_id)
+            finally:
+                # Frames that stopped early (e.g. unknown attachment) may still hold a connection
+                if db.in_transaction():
+                    await run_realtime(db.close)
+                manager.in_flight -= 1
+                request_db_stats.reset(token)
+                record_frame_queries(frame_type, stats)
 
     except WebSocketDisconnect:
-        # Broadcast that user went offline
-        await broadcast_user_status(user_id, False)
-        manager.disconnect(user_id)
+        pass
+    finally:
+        # Runs however the loop ended (disconnect, failed send, unexpected error)
+        await manager.disconnect(user_id, websocket)
+        # Offline is announced after a grace period, so quick reconnects don't flap presence
+        if not manager.draining and user_id not in manager.active_connections:
+            schedule_offline_broadcast(user_id)
+
+
+def schedule_offline_broadcast(user_id: int):
+    def go_offline():
+        manager.pending_offline.pop(user_id, None)
+        if user_id not in manager.active_connections:
+            task = asyncio.create_task(broadcast_user_status(user_id, False))
+            task.add_done_callback(_ignore_send_error)
+
+    cancel_offline_broadcast(user_id)
+    manager.pending_offline[user_id] = asyncio.get_running_loop().call_later(Config.PRESENCE_GRACE_SECONDS, go_offline)
+
+
+def cancel_offline_broadcast(user_id: int) -> bool:
+    """Returns True if the user was still inside their grace period (others never saw them leave)"""
+    timer = manager.pending_offline.pop(user_id, None)
+    if timer is None:
+        return False
+    timer.cancel()
+    return True
+
+
+# Frame fields are checked before any database work; a ValueError/KeyError here becomes
+# an error frame for the sender instead of a failed statement that closes the socket
+def frame_id(message_data: dict, key: str) -> int:
+    value = message_data[key]
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{key} must be an integer")
+    return int(value)
+
+
+def frame_text(message_data: dict, key: str) -> str | None:
+    value = message_data.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{key} must be a string")
+    return value
+
+
+def frame_content(message_data: dict) -> str:
+    """Text of a chat frame; a message needs text, an attachment, or both"""
+    content = frame_text(message_data, "content") or ""
+    if not content.strip() and not message_data.get("attachment"):
+        raise ValueError("Empty message")
+    return content
+
+
+async def resolve_attachment(db: Session, user_id: int, message_data: dict) -> tuple[bool, str | None]:
+    """(ok, sha256) for the frame's optional `attachment`; reports unknown hashes to the sender"""
+    sha256 = frame_text(message_data, "attachment")
+    if not sha256:
+        return True, None
+    if not is_sha256(sha256):
+        raise ValueError("attachment must be a sha256 hex digest")
+    if not await run_realtime(attachment_exists, db, sha256):
+        await manager.send_personal_message({"type": "error", "detail": "Unknown attachment", "tempId": message_data.get("tempId")}, user_id)
+        return False, None
+    return True, sha256
+
+
+async def send_chat_message(db: Session, user_id: int, message_data: dict, received_at: float):
+    """Store a 1:1 message and deliver it to the receiver and back to the sender"""
+    receiver_id = frame_id(message_data, "receiver_id")
+    content = frame_content(message_data)
+    ok, attachment = await resolve_attachment(db, user_id, message_data)
+    if not ok:
+        return
+
+    # 1. Save to MySQL db (on the realtime executor, off the event loop)
+    def store_message():
+        new_message = Message(
+            sender_id=user_id,
+            receiver_id=receiver_id,
+            content=content,
+            attachment_sha256=attachment
+        )
+        db.add(new_message)
+        db.commit()
+        db.refresh(new_message)
+
+        # Keep the search index current
+        message_search.add(new_message)
+
+        # Get unread counts
+        unread_count = db.query(func.count(Message.id)).filter(
+            Message.sender_id == user_id,
+            Message.receiver_id == receiver_id,
+            Message.is_read == False
+        ).scalar()
+
+        # End the transaction so the socket doesn't hold a pooled connection between frames
+        db.close()
+        return new_message, unread_count
+
+    new_message, unread_count = await run_realtime(store_message)
+
+    # prepare response
+    receiver_message = {
+        "type": "chat",
+        "sender_id": user_id,
+        "content": new_message.content,
+        "timestamp": new_message.timestamp,
+        "message_id": new_message.id,
+        "attachment": attachment,
+        "unread_count": unread_count
+    }
+
+    
+    # 2. Push to the receiver
+    await manager.send_personal_message(receiver_message, receiver_id)
+    chat_delivery_seconds.observe(time.perf_counter() - received_at)
+
+    # 3. Also send to sender (for confirmation with DB timestamp)
+    sender_message = receiver_message.copy()
+    sender_message["type"] = "message_sent"
+    await manager.send_personal_message(sender_message, user_id)
+
+
+async def send_channel_message(db: Session, user_id: int, message_data: dict, received_at: float):
+    """Store a group message once and fan it out to the channel's online members"""
+    channel_id = frame_id(message_data, "channel_id")
+    content = frame_content(message_data)
+    if not await run_realtime(channel_registry.is_member, db, channel_id, user_id):
+        await manager.send_personal_message({"type": "error", "detail": "Not a channel member", "channel_id": channel_id}, user_id)
+        return
+
+    ok, attachment = await resolve_attachment(db, user_id, message_data)
+    if not ok:
+        return
+
+    def store_message():
+        new_message = ChannelMessage(
+            channel_id=channel_id,
+            sender_id=user_id,
+            content=content,
+            attachment_sha256=attachment
+        )
+        db.add(new_message)
+        db.commit()
+        db.refresh(new_message)
+        # Recipients come from the cached member list (reloaded once stale)
+        members = channel_registry.get_members(db, channel_id)
+        db.close()
+        return new_message, members
+
+    new_message, members = await run_realtime(store_message)
+
+    # Encode once; every online member (except the sender) gets the identical frame
+    recipients = [uid for uid in online_members(members, manager.active_connections) if uid != user_id]
+    frame = dumps_text({
+        "type": "channel_chat",
+        "channel_id": channel_id,
+        "sender_id": user_id,
+        "content": new_message.content,
+        "timestamp": new_message.timestamp,
+        "message_id": new_message.id,
+        "attachment": attachment
+    })
+    await fan_out(frame, recipients, manager)
+    chat_delivery_seconds.observe(time.perf_counter() - received_at)
+    broadcast_fanout.observe(len(recipients), ("channel_chat",))
+
+    # Confirmation for the sender with the stored id/timestamp
+    await manager.send_personal_message({
+        "type": "message_sent",
+        "channel_id": channel_id,
+        "message_id": new_message.id,
+        "timestamp": new_message.timestamp,
+        "tempId": message_data.get("tempId")
+    }, user_id)
+
+
+async def send_typing_signal(db: Session, user_id: int, message_data: dict, received_at: float):
+    """Ephemeral: relay a typing indicator, throttled, never stored, dropped under backpressure"""
+    is_typing = bool(message_data.get("is_typing", True))
+
+    if "channel_id" in message_data:
+        channel_id = frame_id(message_data, "channel_id")
+        target = ("channel", channel_id)
+        members = channel_registry.cached_members(channel_id)  # Cached membership only, no query
+        if not members or user_id not in members:
+            return
+        recipients = [uid for uid in online_members(members, manager.active_connections) if uid != user_id]
+    else:
+        receiver_id = frame_id(message_data, "receiver_id")
+        target = ("user", receiver_id)
+        recipients = [receiver_id]
+
+    # Stop-typing is neither throttled nor dropped under backpressure, so indicators clear promptly
+    if is_typing and not signal_throttle.allow((user_id, target)):
+        ephemeral_signals.inc(labels=("typing", "throttled"))
+        return
+
+    frame = dumps_text({
+        "type": "typing",
+        "sender_id": user_id,
+        "channel_id": target[1] if target[0] == "channel" else None,
+        "is_typing": is_typing
+    })
+    for recipient in recipients:
+        sent = manager.send_ephemeral(frame, recipient, droppable=is_typing)
+        ephemeral_signals.inc(labels=("typing", "sent" if sent else "dropped"))
+
+
+async def record_heartbeat(db: Session, user_id: int, message_data: dict, received_at: float):
+    """Ephemeral: presence heartbeat. The receive loop already marked the socket active; just count it."""
+    ephemeral_signals.inc(labels=("heartbeat", "received"))
+
+
+async def expire_idle_sockets():
+    """
+    Background loop: close sockets that have been silent (no frames, no heartbeats) past
+    SOCKET_IDLE_TIMEOUT_SECONDS. A half-open connection (a phone that lost its network)
+    would otherwise keep its user online indefinitely.
+    """
+    timeout = Config.SOCKET_IDLE_TIMEOUT_SECONDS
+    if timeout <= 0:
+        return
+    while True:
+        await asyncio.sleep(timeout / 3)
+        cutoff = time.monotonic() - timeout
+        idle = [
+            (user_id, websocket) for user_id, websocket in list(manager.active_connections.items())
+            if manager.last_seen.get(user_id, 0) < cutoff
+        ]
+        for user_id, websocket in idle:
+            await manager.disconnect(user_id, websocket)
+            if not manager.draining:
+                schedule_offline_broadcast(user_id)
+        # A dead peer never acknowledges the close, so don't wait on it for long
+        await asyncio.gather(*(
+            asyncio.wait_for(websocket.close(code=1001), 5) for _, websocket in idle
+        ), return_exceptions=True)
+
+
+# Frame type -> handler(db, user_id, message_data, received_at)
+FRAME_HANDLERS = {
+    "chat": send_chat_message,
+    "channel_chat": send_channel_message,
+    "typing": send_typing_signal,
+    "heartbeat": record_heartbeat,
+}
 
 
 async def broadcast_user_status(user_id: int, is_online: bool):
     """Broadcast user online/offline status to all other users"""
 
-    status_message = {
+    # Encoded once, sent as the same text frame to everyone
+    status_message = dumps_text({
         "type": "user_status",
         "user_id": user_id,
         "is_online": is_online,
-        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
-    }
+        "timestamp": datetime.datetime.now(datetime.timezone.utc)
+    })
 
-    for uid, connection in manager.active_connections.items():
+    recipients = 0
+    for uid in list(manager.active_connections):
         if uid != user_id:
-            try:
-                await connection.send_json(status_message)
-            except:
-                if uid in manager.active_connections.keys():
-                    del manager.active_connections[uid]
\ No newline at end of file
+            recipients += 1
+            await manager.deliver(status_message, uid)
+    broadcast_fanout.observe(recipients, ("user_status",))
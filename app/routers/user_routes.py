@@ -1,18 +1,25 @@
-from fastapi import APIRouter, Depends, Cookie
+from fastapi import APIRouter, Depends, Cookie, Query
 from sqlalchemy.orm import Session
 from app.models import User, Message, func
-from app.auth import verify_access_token
-from app.database import get_database
+from app.auth import verify_access_token, require_user_id
+from app.database import get_database, get_read_database
+from app.search import search_messages
+from app.directory import user_directory
+from app.archive import load_history
+from app.schemas import RosterEntry, UserMatch, ChatMessageOut, MessageSearchPage
+from app.serialization import FastJSONResponse
 from .chat_routes import manager
 from typing import Annotated
 
-router = APIRouter(prefix="/api", tags=["Users"])
+router = APIRouter(prefix="/api", tags=["Users"], default_response_class=FastJSONResponse)
 
-@router.get("/users")
-async def get_all_users(access_token: str = Cookie(alias="Authorization"), db: Session = Depends(get_database)):
+# Database-heavy routes are plain `def`: they run in the threadpool, so a slow roster or
+# history query never blocks the event loop that delivers chat frames
+@router.get("/users", response_model=list[RosterEntry])
+def get_all_users(access_token: str = Cookie(alias="Authorization"), db: Session = Depends(get_read_database)):
 
     current_user_id = verify_access_token(access_token)
-    online_ids = manager.get_online_users()
+    online_ids = manager.active_connections  # dict lookup, not a list scan per user
 
     # 1. Join User with Message to count unread items for current_user_id
     result = db.query(User.id, User.username, func.count(Message.id).label("unread_count")).outerjoin(
@@ -22,24 +29,42 @@ async def get_all_users(access_token: str = Cookie(alias="Authorization"), db: S
         (Message.is_read == False)
     ).filter(User.id != current_user_id).group_by(User.id).all()
 
-    unread_map = [[sender_id, unread_count, sender_username, sender_id in online_ids] for sender_id, unread_count, sender_username in result]
-    return unread_map
+    return FastJSONResponse([
+        {"id": user_id, "username": username, "unread_count": unread_count, "is_online": user_id in online_ids}
+        for user_id, username, unread_count in result
+    ])
 
-@router.get("/messages/{receiver_id}")
-async def get_chat_history(
+@router.get("/users/search", response_model=list[UserMatch])
+async def search_users(
+    q: Annotated[str, Query(min_length=1, max_length=50)],
+    limit: Annotated[int, Query(ge=1, le=50)] = 10,
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    """Typeahead lookup of users by username prefix, served from the in-memory directory"""
+    current_user_id = require_user_id(access_token)
+    online_ids = manager.active_connections
+
+    return FastJSONResponse([
+        {"id": user_id, "username": username, "is_online": user_id in online_ids}
+        for user_id, username in user_directory.search(q, limit, exclude_id=current_user_id)
+    ])
+
+@router.get("/messages/{receiver_id}", response_model=list[ChatMessageOut])
+def get_chat_history(
     receiver_id: int, 
+    before: int | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=500)] = None,
     db: Session = Depends(get_database),
+    read_db: Session = Depends(get_read_database),
     # Use your verify logic to get the logged-in user's ID
     access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
 ):
     # Verify the current user
     current_user_id = int(verify_access_token(access_token))
 
-    # Fetch history where I am sender AND you are receiver OR vice versa
-    messages = db.query(Message).filter(
-        ((Message.sender_id == current_user_id) & (Message.receiver_id == receiver_id)) |
-        ((Message.sender_id == receiver_id) & (Message.receiver_id == current_user_id))
-    ).order_by(Message.timestamp.asc()).all()
+    # Fetch history where I am sender AND you are receiver OR vice versa,
+    # paging into the archive when `before`/`limit` reach past the hot table
+    messages = load_history(read_db, current_user_id, receiver_id, before=before, limit=limit)
 
     db.query(Message).filter(
     Message.sender_id == receiver_id,
@@ -49,11 +74,39 @@ async def get_chat_history(
     
     db.commit()
 
-    return [
-        {
-            "sender_id": m.sender_id,
-            "content": m.content,
-            "timestamp": m.timestamp.isoformat() + "Z"
-        } 
+    # Datetimes are encoded natively (UTC, "Z" suffix) by the response class
+    return FastJSONResponse([
+        {"id": m.id, "sender_id": m.sender_id, "content": m.content, "timestamp": m.timestamp, "attachment": m.attachment}
         for m in messages
-    ]
+    ])
+
+
+@router.get("/search/messages", response_model=MessageSearchPage)
+def search_chat_history(
+    q: str,
+    with_user: int | None = None,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    db: Session = Depends(get_read_database),
+    access_token: Annotated[str | None, Cookie(alias="Authorization")] = None
+):
+    """Search the current user's messages, optionally within one conversation"""
+    current_user_id = require_user_id(access_token)
+
+    total, messages = search_messages(db, current_user_id, q, with_user, offset, limit)
+
+    return FastJSONResponse({
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "results": [
+            {
+                "id": m.id,
+                "sender_id": m.sender_id,
+                "receiver_id": m.receiver_id,
+                "content": m.content,
+                "timestamp": m.timestamp
+            }
+            for m in messages
+        ]
+    })
@@ -1,39 +1,40 @@
 from fastapi import APIRouter, Request, Cookie, Depends
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
 from typing import Annotated
 from sqlalchemy import func
-from app.database import Session, get_database
+from markupsafe import Markup
+from app.database import Session, get_database, get_read_database
 from app.auth import verify_access_token
 from app.models import User, Message
+from app.archive import load_history
+from app.serialization import dumps_script
 from .chat_routes import manager
+from app.templating import templates
+
+# Messages rendered with the chat page; older ones are fetched as the user scrolls up
+FIRST_PAGE_SIZE = 50
 
 # Initialize router
 router = APIRouter(tags=["Pages"])
 
-# Setup templates and static files
-templates = Jinja2Templates(directory="templates")
-router.mount("/static", StaticFiles(directory="static"), name="static")
-
 
 @router.get("/", response_class=HTMLResponse)
 async def show_home_page(request: Request):
     """Render the landing/home page"""
-    return templates.TemplateResponse("view/home.html", {"request": request})
+    return templates.TemplateResponse(request, "view/home.html")
 
 
 @router.get("/about", response_class=HTMLResponse)
 async def show_about_page(request: Request):
     """Render the about/chat information page"""
-    return templates.TemplateResponse("view/about.html", {"request": request})
+    return templates.TemplateResponse(request, "view/about.html")
 
 
 @router.get("/nexus/dashboard", response_class=HTMLResponse)
-async def show_dashboard(
+def show_dashboard(
     request: Request, 
     access_token: Annotated[str | None, Cookie(alias="Authorization")] = None, 
-    db: Session = Depends(get_database)
+    db: Session = Depends(get_read_database)
 ):
     """
     Protected dashboard route.
@@ -55,8 +56,7 @@ async def show_dashboard(
             raise ValueError("User not found in database")
         
         # Render dashboard with user data
-        response = templates.TemplateResponse("chat/dashboard.html", {
-            "request": request, 
+        response = templates.TemplateResponse(request, "chat/dashboard.html", {
             "user_id": user.id,
             "user_name": user.username
         })
@@ -76,32 +76,52 @@ async def show_dashboard(
     
 
 @router.get("/nexus/chat/dm/{receiver_id}", response_class=HTMLResponse)
-async def show_chat_page(
+def show_chat_page(
     request: Request, 
     receiver_id: int,
     access_token: Annotated[str | None, Cookie(alias="Authorization")] = None,
-    db: Session = Depends(get_database)
+    db: Session = Depends(get_read_database),
+    write_db: Session = Depends(get_database)
 ):
     if not access_token:
         return RedirectResponse(url="/", status_code=303)
     # 1. Reuse your auth logic to get current user
-    current_user_id = verify_access_token(access_token)
-    print(current_user_id)
-    
-    # 2. Fetch the person you are talking to
-    receiver = db.query(User).filter(User.id == receiver_id).first()
-    current_user = db.query(User).filter(User.id == int(current_user_id)).first()
+    current_user_id = int(verify_access_token(access_token))
 
-    if not receiver:
+    # 2. Fetch both sides of the conversation in one query
+    users = dict(db.query(User.id, User.username).filter(User.id.in_([receiver_id, current_user_id])).all())
+
+    if receiver_id not in users or current_user_id not in users:
         return RedirectResponse(url="/nexus/dashboard", status_code=303)
-    
-    is_online = receiver.id in manager.active_connections
-
-    return templates.TemplateResponse("chat/simpleChat.html", {
-        "request": request,
-        "user_id": current_user.id,
-        "user_name": current_user.username,
-        "receiver_id": receiver.id,
-        "receiver_name": receiver.username,
-        "is_online": is_online
-    })
\ No newline at end of file
+
+    # 3. Newest page of the conversation, rendered into the page so the client needn't fetch it
+    messages = load_history(db, current_user_id, receiver_id, limit=FIRST_PAGE_SIZE)
+    initial_page = {
+        "messages": [
+            {"id": m.id, "sender_id": m.sender_id, "content": m.content, "timestamp": m.timestamp, "attachment": m.attachment}
+            for m in messages
+        ],
+        # Cursor for the next (older) page
+        "before": messages[0].id if messages else None,
+        "has_more": len(messages) == FIRST_PAGE_SIZE,
+        "page_size": FIRST_PAGE_SIZE
+    }
+
+    # Opening the conversation reads it
+    write_db.query(Message).filter(
+        Message.sender_id == receiver_id,
+        Message.receiver_id == current_user_id,
+        Message.is_read == False
+    ).update({"is_read": True})
+    write_db.commit()
+
+    is_online = receiver_id in manager.active_connections
+
+    return templates.TemplateResponse(request, "chat/simpleChat.html", {
+        "user_id": current_user_id,
+        "user_name": users[current_user_id],
+        "receiver_id": receiver_id,
+        "receiver_name": users[receiver_id],
+        "is_online": is_online,
+        "initial_page": Markup(dumps_script(initial_page))
+    })
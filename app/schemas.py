@@ -1,4 +1,5 @@
 from pydantic import BaseModel, EmailStr
+from datetime import datetime
 # Base class that provides data validation and serialization for all inherited models.
 # It ensures incoming data -> matches the defined types.
 
@@ -46,4 +47,69 @@ class RequestRecoverAccessKey(BaseModel):
 
 class ResetAccessKey(BaseModel):
     new_password: str
-    reset_token: str
\ No newline at end of file
+    reset_token: str
+
+# API response schemas --- --- ---
+# Routes build plain dicts and return them through FastJSONResponse (app/serialization.py);
+# these models document the shape in OpenAPI without a per-row validation pass.
+
+# One row of the dashboard roster
+class RosterEntry(BaseModel):
+    id: int
+    username: str
+    unread_count: int
+    is_online: bool
+
+# Typeahead match from the user directory
+class UserMatch(BaseModel):
+    id: int
+    username: str
+    is_online: bool
+
+# A message in a conversation history page
+class ChatMessageOut(BaseModel):
+    id: int
+    sender_id: int
+    content: str
+    timestamp: datetime
+    attachment: str | None = None
+
+# A message search hit
+class MessageSearchHit(ChatMessageOut):
+    receiver_id: int
+
+class MessageSearchPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    results: list[MessageSearchHit]
+
+
+# Group channels --- --- ---
+
+class ChannelCreate(BaseModel):
+    name: str
+    member_ids: list[int] = []
+
+class ChannelMemberAdd(BaseModel):
+    user_id: int
+
+class ChannelReadCursor(BaseModel):
+    message_id: int
+
+class ChannelOut(BaseModel):
+    id: int
+    name: str
+    unread_count: int
+
+class ChannelMessageOut(ChatMessageOut):
+    channel_id: int
+
+
+# Attachments --- --- ---
+
+class AttachmentOut(BaseModel):
+    sha256: str
+    size: int
+    content_type: str
+    url: str
@@ -0,0 +1,227 @@
+"""
+Message search backed by an inverted index.
+
+Two engines share the same interface:
+- FullTextSearch: MySQL FULLTEXT indexes on messages.content and on the word list of each
+  archive blob (MATCH ... AGAINST in boolean mode). InnoDB keeps them current on every
+  insert, so there is nothing to do on write. Matching blobs are decoded and filtered per message.
+- LocalIndexSearch: a pure-Python inverted index persisted as an append-only log on disk,
+  used for SQLite/local deployments. New messages are appended as they are saved; workers
+  sharing the log pick up each other's lines before every search.
+
+Neither engine scans the messages table to answer a query; matching ids are resolved
+through the index and only the requested page is loaded by primary key (or from the
+archive blobs once app/archive.py has moved it out of the hot table).
+"""
+import json, os, re, threading
+from bisect import bisect_left, insort
+from sqlalchemy.orm import Session
+from .config import Config
+from .database import engine
+from .models import Message, MessageArchive
+from .archive import find_archived_messages, decode_payload
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def conversation_key(user_a: int, user_b: int) -> tuple[int, int]:
+    """Order-independent key for a 1:1 conversation"""
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+def matches_terms(content: str, terms: list[str]) -> bool:
+    """Same semantics as the indexes: every term required, the last one also as a prefix"""
+    words = set(tokenize(content))
+    return all(term in words for term in terms[:-1]) and any(word.startswith(terms[-1]) for word in words)
+
+
+class FullTextSearch:
+    """Search through the MySQL FULLTEXT index"""
+
+    def load(self, db: Session):
+        pass
+
+    def add(self, message: Message):
+        pass
+
+    def search(self, db: Session, user_id: int, query: str, with_user_id: int | None = None,
+               offset: int = 0, limit: int = 20) -> tuple[int, list[int]]:
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+
+        # Every term is required, the last one also matches as a prefix (typeahead)
+        boolean_query = " ".join(f"+{term}" for term in terms) + "*"
+
+        if with_user_id is None:
+            scope = (Message.sender_id == user_id) | (Message.receiver_id == user_id)
+        else:
+            scope = ((Message.sender_id == user_id) & (Message.receiver_id == with_user_id)) | \
+                    ((Message.sender_id == with_user_id) & (Message.receiver_id == user_id))
+
+        matches = db.query(Message.id).filter(Message.content.match(boolean_query), scope)
+        total = matches.count()
+        # The newest offset+limit hot ids are enough to fill the page after merging in the archive
+        ids = [row.id for row in matches.order_by(Message.id.desc()).limit(offset + limit)]
+
+        archived = self._search_archives(db, user_id, with_user_id, boolean_query, terms)
+        ids = sorted(ids + archived, reverse=True)[offset:offset + limit]
+        return total + len(archived), ids
+
+    def _search_archives(self, db: Session, user_id: int, with_user_id: int | None,
+                         boolean_query: str, terms: list[str]) -> list[int]:
+        """Ids of archived messages matching the query; the index narrows it down to whole blobs"""
+        if with_user_id is None:
+            scope = (MessageArchive.user_low_id == user_id) | (MessageArchive.user_high_id == user_id)
+        else:
+            low, high = conversation_key(user_id, with_user_id)
+            scope = (MessageArchive.user_low_id == low) & (MessageArchive.user_high_id == high)
+
+        archives = db.query(MessageArchive).filter(MessageArchive.search_terms.match(boolean_query), scope)
+        return [
+            entry.id for archive in archives.yield_per(8)
+            for entry in decode_payload(archive) if matches_terms(entry.content, terms)
+        ]
+
+
+class LocalIndexSearch:
+    """
+    In-process inverted index: term -> ascending list of message ids.
+    Each indexed message is appended to a log file as [id, sender_id, receiver_id, [terms]],
+    which is replayed on startup and tailed before each search, so messages saved by other
+    workers on the same host are found too. Terms are also kept sorted so prefix queries are a bisect.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.postings: dict[str, list[int]] = {}
+        self.terms: list[str] = []
+        self.conversations: dict[int, tuple[int, int]] = {}
+        # Bytes of the log already indexed
+        self.offset = 0
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def load(self, db: Session):
+        """Replay the on-disk log, or build it from the messages table on first run"""
+        with self.lock:
+            if self.loaded:
+                return
+
+            if os.path.exists(self.path):
+                self._catch_up()
+            else:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as log:
+                    # One-off bootstrap, streamed in id order so postings stay sorted
+                    rows = db.query(Message.id, Message.sender_id, Message.receiver_id, Message.content) \
+                        .order_by(Message.id.asc()).yield_per(1000)
+                    for message_id, sender_id, receiver_id, content in rows:
+                        terms = sorted(set(tokenize(content)))
+                        self._insert(message_id, sender_id, receiver_id, terms)
+                        log.write(json.dumps([message_id, sender_id, receiver_id, terms]) + "\n")
+                self.offset = os.path.getsize(self.path)
+
+            self.loaded = True
+
+    def _catch_up(self):
+        """Index log lines appended since the last read (by this or another worker)"""
+        try:
+            if os.path.getsize(self.path) <= self.offset:
+                return
+        except OSError:
+            return
+
+        with open(self.path, "rb") as log:
+            log.seek(self.offset)
+            for line in log:
+                if not line.endswith(b"\n"):
+                    break  # Still being written; picked up on the next search
+                self.offset += len(line)
+                if line.strip():
+                    message_id, sender_id, receiver_id, terms = json.loads(line)
+                    # Our own appends are already indexed
+                    if message_id not in self.conversations:
+                        self._insert(message_id, sender_id, receiver_id, terms)
+
+    def add(self, message: Message):
+        """Index a freshly persisted message"""
+        terms = sorted(set(tokenize(message.content)))
+        with self.lock:
+            if message.id in self.conversations:
+                return
+            self._insert(message.id, message.sender_id, message.receiver_id, terms)
+            with open(self.path, "a", encoding="utf-8") as log:
+                log.write(json.dumps([message.id, message.sender_id, message.receiver_id, terms]) + "\n")
+
+    def _insert(self, message_id: int, sender_id: int, receiver_id: int, terms: list[str]):
+        self.conversations[message_id] = conversation_key(sender_id, receiver_id)
+        for term in terms:
+            ids = self.postings.get(term)
+            if ids is None:
+                self.postings[term] = [message_id]
+                insort(self.terms, term)
+            elif ids[-1] < message_id:
+                ids.append(message_id)
+            else:
+                insort(ids, message_id)
+
+    def _prefix_matches(self, prefix: str) -> set[int]:
+        matches = set()
+        position = bisect_left(self.terms, prefix)
+        while position < len(self.terms) and self.terms[position].startswith(prefix):
+            matches.update(self.postings[self.terms[position]])
+            position += 1
+        return matches
+
+    def search(self, db: Session, user_id: int, query: str, with_user_id: int | None = None,
+               offset: int = 0, limit: int = 20) -> tuple[int, list[int]]:
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+
+        with self.lock:
+            self._catch_up()
+            # Exact terms first (smallest postings list leads), the last term as a prefix
+            candidates = [set(self.postings.get(term, ())) for term in terms[:-1]]
+            candidates.append(self._prefix_matches(terms[-1]))
+            candidates.sort(key=len)
+            matched = candidates[0].intersection(*candidates[1:])
+
+            if with_user_id is None:
+                ids = [i for i in matched if user_id in self.conversations[i]]
+            else:
+                key = conversation_key(user_id, with_user_id)
+                ids = [i for i in matched if self.conversations[i] == key]
+
+        ids.sort(reverse=True)
+        return len(ids), ids[offset:offset + limit]
+
+
+# Pick the engine matching the configured database
+if engine.dialect.name == "mysql":
+    message_search = FullTextSearch()
+else:
+    message_search = LocalIndexSearch(Config.SEARCH_INDEX_PATH)
+
+
+def search_messages(db: Session, user_id: int, query: str, with_user_id: int | None = None,
+                    offset: int = 0, limit: int = 20) -> tuple[int, list[Message]]:
+    """Return the total match count and one page of the user's messages, newest first"""
+    message_search.load(db)
+    total, ids = message_search.search(db, user_id, query, with_user_id, offset, limit)
+    if not ids:
+        return total, []
+
+    rows = {m.id: m for m in db.query(Message).filter(Message.id.in_(ids)).all()}
+
+    # Ids missing from the hot table have been moved to the archive
+    missing = [i for i in ids if i not in rows]
+    rows.update((entry.id, entry) for entry in find_archived_messages(db, missing))
+
+    return total, [rows[i] for i in ids if i in rows]
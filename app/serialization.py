@@ -0,0 +1,51 @@
+"""
+Fast JSON encoding for API responses and socket frames.
+
+orjson serializes datetimes, dataclasses and plain containers natively in C,
+skipping FastAPI's jsonable_encoder walk. Naive datetimes from the database are
+UTC and are emitted with a trailing "Z". Falls back to the stdlib when orjson
+is not installed.
+"""
+import json
+from datetime import datetime
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def _default(value):
+        if isinstance(value, datetime):
+            return value.isoformat() + ("Z" if value.tzinfo is None else "")
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+    def dumps(content) -> bytes:
+        return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+    loads = json.loads
+
+
+def dumps_text(content) -> str:
+    """Encoded JSON as str, for WebSocket text frames"""
+    return dumps(content).decode()
+
+
+def dumps_script(content) -> str:
+    """JSON safe to embed in an HTML <script> block (no "</script>" or "<!--" breakouts)"""
+    return dumps_text(content).replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; return it directly to skip response_model validation"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,33 @@
+"""
+Ephemeral signals (typing indicators, presence heartbeats).
+
+Signals never touch the database. The server throttles them per sender and target,
+and drops them instead of queueing when the recipient's socket is still busy with a
+previous send, so a slow client can never build up a backlog of stale signals.
+"""
+import time
+from .config import Config
+
+
+class SignalThrottle:
+    """Allows one signal per (sender, target, kind) every `interval` seconds"""
+
+    def __init__(self, interval: float, max_entries: int = 100_000):
+        self.interval = interval
+        self.max_entries = max_entries
+        self.last_sent: dict[tuple, float] = {}
+
+    def allow(self, key: tuple) -> bool:
+        now = time.monotonic()
+        last = self.last_sent.get(key)
+        if last is not None and now - last < self.interval:
+            return False
+        if len(self.last_sent) >= self.max_entries:
+            # Forget stale entries rather than growing without bound
+            cutoff = now - self.interval
+            self.last_sent = {k: t for k, t in self.last_sent.items() if t >= cutoff}
+        self.last_sent[key] = now
+        return True
+
+
+signal_throttle = SignalThrottle(interval=Config.SIGNAL_MIN_INTERVAL_MS / 1000)
@@ -0,0 +1,22 @@
+"""
+Shared Jinja2 environment for every router.
+
+Templates are compiled once at startup (warm_templates) and served from Jinja's
+cache afterwards; filesystem checks for changed templates are only enabled with
+TEMPLATE_AUTO_RELOAD=true for local development.
+"""
+from fastapi.templating import Jinja2Templates
+from .config import Config
+
+templates = Jinja2Templates(directory="templates")
+templates.env.auto_reload = Config.TEMPLATE_AUTO_RELOAD
+# Keep every compiled template (the default LRU only holds 400)
+templates.env.cache = {}
+
+
+def warm_templates() -> int:
+    """Compile all page templates up front, returns how many were loaded"""
+    names = [name for name in templates.env.list_templates(extensions=["html"]) if not name.startswith("emails/")]
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
@@ -1,17 +1,29 @@
-import bcrypt, random, smtplib, ssl, os, secrets, hashlib
-from email.message import EmailMessage
+import bcrypt, random, os, secrets, hashlib, time, asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from .config import Config
+from .metrics import password_hash_seconds
 
 def generate_otp():
     return f"{random.randint(100000, 999999)}"
 
 
 
+# Email templates are read once, on first use
+@lru_cache(maxsize=None)
+def load_email_template(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
 def send_otp_email(receiver_email: str, code: str):
+    # Mail modules are only imported by the background task that actually sends mail
+    import smtplib, ssl
+    from email.message import EmailMessage
+
     msg = EmailMessage()
     
     # Read HTML template
-    with open("templates/emails/verify-otp-email.html", "r") as f:
-        html_content = f.read().replace("{code}", code)
+    html_content = load_email_template("templates/emails/verify-otp-email.html").replace("{code}", code)
     
     # Set HTML content
     msg.add_alternative(html_content, subtype='html')
@@ -42,21 +54,38 @@ def hash_token(token: str) -> str:
 
 # takes raw password -> returns an hashed one (#####)
 def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password=password.encode(), salt=bcrypt.gensalt())
+    start = time.perf_counter()
+    hashed = bcrypt.hashpw(password=password.encode(), salt=bcrypt.gensalt())
+    password_hash_seconds.observe(time.perf_counter() - start, ("hash",))
+    return hashed
 
 # checks the raw password with the respected hashed one
 def verify_password(password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(password=password.encode(), hashed_password=hashed_password.encode())
+    start = time.perf_counter()
+    matches = bcrypt.checkpw(password=password.encode(), hashed_password=hashed_password.encode())
+    password_hash_seconds.observe(time.perf_counter() - start, ("verify",))
+    return matches
+
+# bcrypt thread pool, created on first use
+@lru_cache(maxsize=None)
+def get_password_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+# async variant for `async def` routes: hash off the event loop
+async def hash_password_async(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(get_password_pool(), hash_password, password)
 
 def generate_reset_token():
     return secrets.token_urlsafe(64)
 
 def send_reset_link_email(receiver_email: str, reset_link: str):
+    import smtplib, ssl
+    from email.message import EmailMessage
+
     msg = EmailMessage()
     
     # Read HTML template
-    with open("templates/emails/password-reset-email.html", "r") as f:
-        html_content = f.read().replace("{reset_link}", reset_link)
+    html_content = load_email_template("templates/emails/password-reset-email.html").replace("{reset_link}", reset_link)
     
     # Set HTML content
     msg.add_alternative(html_content, subtype='html')
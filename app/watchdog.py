@@ -0,0 +1,176 @@
+"""
+Event-loop lag watchdog and opt-in sampling profiler.
+
+LoopWatchdog runs a heartbeat coroutine on the event loop and a monitor thread
+beside it. The heartbeat measures how late each wake-up is (loop lag); when the
+monitor sees no heartbeat for longer than the threshold, the loop is blocked and
+it captures the loop thread's current stack so the offending call can be found.
+
+RequestProfiler samples stacks for a single request when the caller sends the
+X-Nexus-Profile header with the admin token; the collapsed stacks are kept for
+retrieval through /admin/profiles/{id}.
+"""
+import asyncio, sys, threading, time, traceback, uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from .config import Config
+from .metrics import event_loop_lag_seconds, event_loop_stalls
+
+
+def _format_stack(frame) -> list[str]:
+    return [line.rstrip() for line in traceback.format_stack(frame)]
+
+
+class LoopWatchdog:
+    def __init__(self, interval: float, threshold: float, max_samples: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.samples: deque[dict] = deque(maxlen=max_samples)
+        self.last_beat = time.monotonic()
+        self.max_lag = 0.0
+        self.loop_thread_id: int | None = None
+        self.heartbeat_task: asyncio.Task | None = None
+        self.monitor_thread: threading.Thread | None = None
+        self.stopping = threading.Event()
+        self.current_stall: dict | None = None
+
+    def start(self):
+        """Start watching the running event loop"""
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.stopping.clear()
+        self.heartbeat_task = asyncio.create_task(self._heartbeat())
+        self.monitor_thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self.monitor_thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.last_beat = now
+            self.max_lag = max(self.max_lag, lag)
+            event_loop_lag_seconds.observe(lag)
+
+            # The loop is running again; close out the stall captured by the monitor
+            stall = self.current_stall
+            if stall is not None:
+                stall["blocked_ms"] = round(lag * 1000, 1)
+                self.current_stall = None
+                print(f"Event loop blocked for {stall['blocked_ms']}ms in:\n" + "\n".join(stall["stack"][-6:]))
+
+    def _monitor(self):
+        while not self.stopping.wait(self.interval / 2):
+            blocked_for = time.monotonic() - self.last_beat - self.interval
+            if blocked_for < self.threshold or self.current_stall is not None:
+                continue
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+
+            stall = {
+                "detected_at": datetime.now(timezone.utc).isoformat(),
+                "blocked_ms": round(blocked_for * 1000, 1),
+                "stack": _format_stack(frame)
+            }
+            self.current_stall = stall
+            self.samples.append(stall)
+            event_loop_stalls.inc()
+
+    def report(self) -> dict:
+        return {
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "current_lag_ms": round(max(0.0, time.monotonic() - self.last_beat - self.interval) * 1000, 1),
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "stalls": list(self.samples)
+        }
+
+
+class RequestProfiler:
+    """Samples every other thread's stack at a fixed rate until stopped"""
+
+    def __init__(self, path: str, rate: float = 0.001):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.rate = rate
+        self.stacks: Counter[str] = Counter()
+        self.sample_count = 0
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self.stopping.wait(self.rate):
+            self.sample_count += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = traceback.extract_stack(frame)
+                # Skip idle threads (waiting in the selector or a pool queue)
+                if stack and stack[-1].name in ("select", "wait", "_worker", "run"):
+                    continue
+                self.stacks[";".join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})" for f in stack)] += 1
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "path": self.path,
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.sample_count,
+            # Collapsed stacks (flamegraph.pl / speedscope compatible), hottest first
+            "stacks": [{"stack": stack, "count": count} for stack, count in self.stacks.most_common(200)]
+        }
+
+
+class ProfilerMiddleware:
+    """Profile a request when it carries X-Nexus-Profile: <ADMIN_TOKEN>"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not Config.ADMIN_TOKEN:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if headers.get(b"x-nexus-profile", b"").decode() != Config.ADMIN_TOKEN:
+            return await self.app(scope, receive, send)
+
+        profiler = RequestProfiler(scope["path"])
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-nexus-profile-id", profiler.id.encode())]
+            await send(message)
+
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            recent_profiles.append(profiler.report())
+
+
+loop_watchdog = LoopWatchdog(
+    interval=Config.WATCHDOG_INTERVAL_MS / 1000,
+    threshold=Config.WATCHDOG_THRESHOLD_MS / 1000
+)
+recent_profiles: deque[dict] = deque(maxlen=20)
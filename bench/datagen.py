@@ -0,0 +1,96 @@
+"""
+Synthetic data for benchmarks.
+
+Fills the configured database (DATABASE_URL) with users and 1:1 messages using bulk
+inserts. Every user shares one bcrypt hash of BENCH_PASSWORD so generation stays fast
+while logins still exercise the real verify path.
+
+    DATABASE_URL=sqlite:///./bench.db python -m bench.datagen --users 10000 --messages 200000
+"""
+import argparse, random, time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert
+
+BENCH_PASSWORD = "benchmark-access-key"
+
+
+def bench_email(index: int) -> str:
+    return f"bench{index}@bench.nebula-nexus.dev"
+
+
+def bench_accounts(db, limit: int | None = None) -> list[tuple[int, str]]:
+    """(id, email) of the generated users, oldest first"""
+    from app.models import User
+    query = db.query(User.id, User.email).filter(User.username.like("bench_user_%")).order_by(User.id)
+    return [(user_id, email) for user_id, email in query.limit(limit)]
+
+
+def generate(users: int, messages: int, active_users: int, days: int, seed: int, chunk_size: int = 10000) -> dict:
+    # Imported late so DATABASE_URL from the command line/environment is honoured
+    from app.database import SessionLocal
+    from app.models import User, Message
+    from app.migrate import migrate
+    from app.utils import hash_password
+
+    migrate()
+    rng = random.Random(seed)
+    db = SessionLocal()
+    started = time.perf_counter()
+
+    try:
+        # Only a naming offset; ids are read back since auto-increment may leave gaps
+        first_index = (db.query(User.id).order_by(User.id.desc()).limit(1).scalar() or 0) + 1
+        hashed = hash_password(BENCH_PASSWORD).decode()
+
+        user_ids = []
+        for start in range(0, users, chunk_size):
+            emails = [bench_email(first_index + i) for i in range(start, min(start + chunk_size, users))]
+            db.execute(insert(User), [
+                {"username": f"bench_user_{first_index + start + i}", "email": email, "password": hashed}
+                for i, email in enumerate(emails)
+            ])
+            db.commit()
+            user_ids.extend(user_id for (user_id,) in db.query(User.id).filter(User.email.in_(emails)).order_by(User.id))
+
+        # Most traffic happens between a smaller set of active users
+        talkers = user_ids[:max(2, min(active_users, users))]
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        span = timedelta(days=days).total_seconds()
+
+        # Timestamps increase with ids, like real traffic
+        offsets = sorted((rng.random() * span for _ in range(messages)), reverse=True)
+        for start in range(0, messages, chunk_size):
+            rows = []
+            for offset in offsets[start:start + chunk_size]:
+                sender, receiver = rng.sample(talkers, 2)
+                rows.append({
+                    "sender_id": sender,
+                    "receiver_id": receiver,
+                    "content": f"synthetic message {rng.randrange(1_000_000)} about nebula {rng.choice(['orion', 'andromeda', 'carina', 'eagle', 'crab'])}",
+                    "timestamp": now - timedelta(seconds=offset),
+                    "is_read": offset > 86400  # Anything older than a day has been read
+                })
+            db.execute(insert(Message), rows)
+            db.commit()
+    finally:
+        db.close()
+
+    return {
+        "users": users,
+        "messages": messages,
+        "first_user_id": user_ids[0] if user_ids else None,
+        "active_users": len(talkers),
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic users and messages")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--active-users", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(generate(args.users, args.messages, args.active_users, args.days, args.seed))
@@ -0,0 +1,355 @@
+"""
+Load test and benchmark runner for the chat and auth paths.
+
+Boots the app under uvicorn against a local database (SQLite by default, or a local
+MySQL URL), optionally seeds it with bench.datagen, then drives:
+- ws_connect / ws_chat: thousands of sockets on /ws/{user_id} exchanging messages,
+  timed from send to the server's `message_sent` acknowledgement
+- http_*: login, dashboard, roster and history traffic from concurrent sessions
+
+Results are written as JSON (throughput, p50/p99 latency, errors and DB query counts
+taken from /metrics) together with the git commit, so runs can be compared across commits.
+
+    python -m bench.run --fresh --users 5000 --messages 100000 --clients 1000 --output bench.json
+
+Requires `uvicorn`, `httpx` and `websockets` in addition to the app's dependencies.
+"""
+import argparse, asyncio, json, os, platform, random, re, subprocess, sys, tempfile, time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRIC_LINE = re.compile(r'^(\w+)(?:\{(.*)\})? ([0-9.eE+-]+)$')
+
+
+# Helpers --- --- --- --- ---
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else None
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_metrics(text: str) -> dict[tuple[str, str], float]:
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, labels, value = match.groups()
+            samples[(name, labels or "")] = float(value)
+    return samples
+
+
+async def scrape(client) -> dict[tuple[str, str], float] | None:
+    """Current /metrics samples, None when the server doesn't answer (overloaded or gone)"""
+    try:
+        response = await client.get("/metrics")
+    except Exception:
+        return None
+    return parse_metrics(response.text) if response.status_code == 200 else None
+
+
+def query_delta(before: dict | None, after: dict | None) -> dict:
+    """DB statements executed between two scrapes, in total and per route"""
+    if before is None or after is None:
+        return {"db_queries": None, "db_queries_per_request": {}}
+    total = after.get(("nexus_db_query_duration_seconds_count", ""), 0) - \
+            before.get(("nexus_db_query_duration_seconds_count", ""), 0)
+    per_route = {}
+    for (name, labels), value in after.items():
+        if name != "nexus_db_queries_per_request_sum":
+            continue
+        requests = after.get(("nexus_db_queries_per_request_count", labels), 0) - \
+                   before.get(("nexus_db_queries_per_request_count", labels), 0)
+        if requests:
+            queries = value - before.get((name, labels), 0)
+            route = labels.split('"')[1]
+            if route != "/metrics":
+                per_route[route] = round(queries / requests, 2)
+    return {"db_queries": int(total), "db_queries_per_request": per_route}
+
+
+# Server --- --- --- --- ---
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def wait_until_ready(client, server: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            if (await client.get("/metrics")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+# WebSocket Scenarios --- --- --- --- ---
+
+async def run_websocket_scenario(base_ws: str, user_ids: list[int], messages_per_client: int, seed: int) -> dict:
+    import websockets
+
+    connect_latencies, ack_latencies = [], []
+    errors = {"connect": 0, "chat": 0}
+    delivered = [0]
+
+    async def open_socket(user_id: int):
+        start = time.perf_counter()
+        try:
+            socket = await websockets.connect(f"{base_ws}/ws/{user_id}", max_queue=None, open_timeout=30)
+        except Exception:
+            errors["connect"] += 1
+            return None
+        connect_latencies.append(time.perf_counter() - start)
+        return socket
+
+    started = time.perf_counter()
+    sockets = await asyncio.gather(*(open_socket(user_id) for user_id in user_ids))
+    connect_elapsed = time.perf_counter() - started
+    clients = [(user_id, socket) for user_id, socket in zip(user_ids, sockets) if socket is not None]
+
+    async def chat(user_id: int, socket):
+        # Own generator per client: the peers it picks don't depend on how the others interleave
+        rng = random.Random(seed + user_id)
+        for _ in range(messages_per_client):
+            peer = rng.choice(user_ids)
+            while peer == user_id:
+                peer = rng.choice(user_ids)
+            start = time.perf_counter()
+            try:
+                await socket.send(json.dumps({"receiver_id": peer, "content": f"bench {user_id}->{peer}"}))
+                # Other frames (chat deliveries, presence) interleave with our acknowledgement
+                while True:
+                    frame = json.loads(await asyncio.wait_for(socket.recv(), timeout=30))
+                    if frame.get("type") == "message_sent":
+                        break
+                    if frame.get("type") == "chat":
+                        delivered[0] += 1
+            except Exception:
+                errors["chat"] += 1
+                return
+            ack_latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(chat(user_id, socket) for user_id, socket in clients))
+    chat_elapsed = time.perf_counter() - started
+
+    await asyncio.gather(*(socket.close() for _, socket in clients), return_exceptions=True)
+
+    return {
+        "ws_connect": summarize(connect_latencies, errors["connect"], connect_elapsed),
+        "ws_chat": {**summarize(ack_latencies, errors["chat"], chat_elapsed), "deliveries_observed": delivered[0]}
+    }
+
+
+# HTTP Scenarios --- --- --- --- ---
+
+async def run_http_scenario(base_url: str, accounts: list[tuple[int, str]], sessions: int, iterations: int,
+                            seed: int) -> dict:
+    import httpx
+    from bench.datagen import BENCH_PASSWORD
+
+    user_ids = [user_id for user_id, _ in accounts]
+
+    latencies = {"http_login": [], "http_dashboard": [], "http_roster": [], "http_history": []}
+    errors = {name: 0 for name in latencies}
+
+    async def timed(name: str, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            if response.status_code >= 400:
+                errors[name] += 1
+                return None
+        except Exception:
+            errors[name] += 1
+            return None
+        latencies[name].append(time.perf_counter() - start)
+        return response
+
+    async def session(user_id: int, email: str):
+        rng = random.Random(seed + user_id)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            response = await timed("http_login", client.post("/auth/login", data={
+                "email": email,
+                "password": BENCH_PASSWORD
+            }))
+            token = response.cookies.get("Authorization") if response is not None else None
+            if not token:
+                return
+            # Cookies flagged `secure` are not replayed over plain http, so set it explicitly
+            client.cookies.set("Authorization", token)
+
+            for _ in range(iterations):
+                await timed("http_dashboard", client.get("/nexus/dashboard"))
+                await timed("http_roster", client.get("/api/users"))
+                await timed("http_history", client.get(f"/api/messages/{rng.choice(user_ids)}", params={"limit": 50}))
+
+    started = time.perf_counter()
+    chosen = random.Random(seed).sample(accounts, min(sessions, len(accounts)))
+    await asyncio.gather(*(session(user_id, email) for user_id, email in chosen))
+    elapsed = time.perf_counter() - started
+
+    return {name: summarize(values, errors[name], elapsed) for name, values in latencies.items()}
+
+
+# Entry Point --- --- --- --- ---
+
+async def benchmark(args, env: dict, accounts: list[tuple[int, str]]) -> tuple[dict, dict]:
+    """Run every scenario; returns (results, failures). A scenario that crashes or times out
+    is recorded in failures and the remaining ones still run."""
+    import httpx
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    user_ids = [user_id for user_id, _ in accounts]
+    scenarios, failures = {}, {}
+
+    server = start_server(env, args.port)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+            try:
+                await wait_until_ready(client, server)
+            except RuntimeError as e:
+                failures["startup"] = str(e)
+                return scenarios, failures
+
+            async def measure(name: str, scenario) -> tuple[dict, dict] | None:
+                before = await scrape(client)
+                try:
+                    results = await scenario
+                except Exception as e:
+                    failures[name] = repr(e)
+                    return None
+                if server.poll() is not None:
+                    failures[name] = f"Server exited with code {server.returncode}"
+                return results, query_delta(before, await scrape(client))
+
+            measured = await measure("websocket", run_websocket_scenario(
+                f"ws://127.0.0.1:{args.port}", user_ids, args.messages_per_client, args.seed
+            ))
+            if measured:
+                ws_results, delta = measured
+                ws_results["ws_chat"].update(delta)
+                scenarios.update(ws_results)
+
+            if server.poll() is None:
+                measured = await measure("http", run_http_scenario(
+                    base_url, accounts, args.sessions, args.iterations, args.seed
+                ))
+                if measured:
+                    http_results, delta = measured
+                    for result in http_results.values():
+                        result["db_queries_per_request"] = delta["db_queries_per_request"]
+                    scenarios.update(http_results)
+    finally:
+        stop_server(server)
+
+    return scenarios, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat and auth paths")
+    parser.add_argument("--database-url", default=None, help="Defaults to a SQLite file in a temp directory")
+    parser.add_argument("--fresh", action="store_true", help="Seed a new database before running")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=1000, help="Concurrent WebSocket clients")
+    parser.add_argument("--messages-per-client", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=50, help="Concurrent HTTP sessions")
+    parser.add_argument("--iterations", type=int, default=10, help="Dashboard/roster/history rounds per session")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nexus-bench-")
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    fresh = args.fresh or args.database_url is None
+
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": database_url,
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search-index.log"),
+        "SECRET_KEY": env.get("SECRET_KEY", "bench-secret"),
+        "ADMIN_TOKEN": env.get("ADMIN_TOKEN", "bench-admin"),
+        # Keep the archiver idle so it doesn't compete with the measured traffic
+        "ARCHIVE_AFTER_DAYS": "36500"
+    })
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+    from bench.datagen import generate, bench_accounts
+    from app.database import SessionLocal
+    seed_info = generate(args.users, args.messages, active_users=args.clients, days=365, seed=args.seed) if fresh else {}
+
+    # Ids are read back rather than assumed contiguous
+    db = SessionLocal()
+    try:
+        accounts = bench_accounts(db, args.clients)
+    finally:
+        db.close()
+    if not accounts:
+        sys.exit("No bench users found, run with --fresh")
+    seed_info.setdefault("first_user_id", accounts[0][0])
+
+    scenarios, failures = asyncio.run(benchmark(args, env, accounts))
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": database_url.split(":", 1)[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "database_url")},
+        "seed": seed_info,
+        "scenarios": scenarios,
+        "failures": failures
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
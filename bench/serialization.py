@@ -0,0 +1,66 @@
+"""
+Serialization micro-benchmark for the largest API responses.
+
+Compares FastAPI's default path (jsonable_encoder + json.dumps, as JSONResponse does
+for a returned dict/list) against app.serialization on a 10k-message history page
+and a 10k-user roster.
+
+    python -m bench.serialization --rows 10000 --repeat 20
+"""
+import argparse, json, os, statistics, sys, time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def history_rows(count: int) -> list[dict]:
+    start = datetime(2025, 1, 1)
+    return [
+        {"id": i, "sender_id": 1 + i % 2, "content": f"message number {i} across the nebula", "timestamp": start + timedelta(seconds=i)}
+        for i in range(count)
+    ]
+
+
+def roster_rows(count: int) -> list[dict]:
+    return [
+        {"id": i, "username": f"stellar_user_{i}", "unread_count": i % 7, "is_online": i % 3 == 0}
+        for i in range(count)
+    ]
+
+
+def time_call(function, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - started)
+    return {"median_ms": round(statistics.median(samples) * 1000, 3), "min_ms": round(min(samples) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding of large responses")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from fastapi.encoders import jsonable_encoder
+    from app import serialization
+
+    def default_path(rows):
+        # What JSONResponse does with a plain return value
+        return json.dumps(jsonable_encoder(rows), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    results = {"encoder": "orjson" if serialization.orjson else "stdlib", "rows": args.rows}
+    for name, rows in (("history", history_rows(args.rows)), ("roster", roster_rows(args.rows))):
+        results[name] = {
+            "default": time_call(lambda: default_path(rows), args.repeat),
+            "fast": time_call(lambda: serialization.dumps(rows), args.repeat),
+            "bytes": len(serialization.dumps(rows))
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,27 @@
     const chatContainer = document.getElementById('messagesFeed');
     const sendBtn = document.getElementById('sendButton');
     const input = document.getElementById('chatInput');
+    const attachBtn = document.getElementById('attachButton');
+    const attachInput = document.getElementById('attachInput');
 
     const pendingMessages = new Map();
     // stores temporary message id's
 
+    let historyCursor = null;
+    let hasOlderMessages = false;
+    let pageSize = 50;
+    let loadingOlder = false;
+    // paging state for older messages (the newest page is rendered into the page)
+
+    let typingSent = false;
+    let typingSentAt = 0;
+    let typingTimer = null;
+    let typingExpiry = null;
+    // typing indicator state (signals are ephemeral, never stored)
+    const TYPING_REFRESH_MS = 4000;
+    const TYPING_EXPIRY_MS = 6000;
+    // the sender repeats its signal while typing; the receiver clears it when the repeats stop
+
     const init = () => {
         if (!chatContainer) return;
         // returns back if message container not found
@@ -13,7 +30,14 @@
         loadHistory();
         // load the history of chat
 
+        chatContainer.addEventListener('scroll', () => {
+            if (chatContainer.scrollTop < 40) loadOlderMessages();
+        });
+
         sendBtn?.addEventListener('click', sendMessage);
+        attachBtn?.addEventListener('click', () => attachInput?.click());
+        attachInput?.addEventListener('change', sendAttachment);
+        input?.addEventListener('input', notifyTyping);
         input?.addEventListener('keypress', (e) => {
             if (e.key == 'Enter' && !e.shiftKey) {
                 e.preventDefault();
@@ -32,15 +56,71 @@
 
         // Listen for user status updates (online/offline)
         window.socketService.addEventListener('user_status', handleUserStatus);
+
+        // Listen for typing indicators
+        window.socketService.addEventListener('typing', handleTyping);
+    }
+
+    function notifyTyping() {
+        if (!window.socketService) return;
+
+        if (!typingSent || Date.now() - typingSentAt > TYPING_REFRESH_MS) {
+            window.socketService.send({ type: 'typing', receiver_id: receiverId, is_typing: true });
+            typingSent = true;
+            typingSentAt = Date.now();
+        }
+
+        // Send a stop signal after a pause in typing
+        clearTimeout(typingTimer);
+        typingTimer = setTimeout(stopTyping, 3000);
+    }
+
+    function stopTyping() {
+        clearTimeout(typingTimer);
+        if (typingSent && window.socketService) {
+            window.socketService.send({ type: 'typing', receiver_id: receiverId, is_typing: false });
+        }
+        typingSent = false;
+    }
+
+    function handleTyping(event) {
+        const data = event.detail;
+        if (data.sender_id != receiverId || data.channel_id) return;
+
+        if (!data.is_typing) {
+            clearTypingIndicator();
+            return;
+        }
+
+        const lastSeen = document.querySelector('.chat-header .last-seen');
+        if (!lastSeen) return;
+
+        lastSeen.dataset.status = lastSeen.dataset.status || lastSeen.textContent.trim();
+        lastSeen.textContent = 'typing...';
+
+        // A stop signal can be lost (closed tab, dropped connection), so expire on our own
+        clearTimeout(typingExpiry);
+        typingExpiry = setTimeout(clearTypingIndicator, TYPING_EXPIRY_MS);
+    }
+
+    function clearTypingIndicator() {
+        clearTimeout(typingExpiry);
+        const lastSeen = document.querySelector('.chat-header .last-seen');
+        if (lastSeen && lastSeen.dataset.status) {
+            lastSeen.textContent = lastSeen.dataset.status;
+            delete lastSeen.dataset.status;
+        }
     }
 
     function handleIncomingMessage(event) {
         const data = event.detail
 
         if (data.sender_id == receiverId) {
+            clearTypingIndicator();
             appendMessageToUI({
                 content: data.content,
                 timestamp: data.timestamp,
+                attachment: data.attachment,
                 isMe: data.sender_id == userId
             });
 
@@ -84,6 +164,7 @@
             if (headerStatusDot) {
                 headerStatusDot.className = `status-dot ${data.is_online ? 'online' : 'offline'}`;
             }
+            if (!data.is_online) clearTypingIndicator();
         }
     }
 
@@ -99,6 +180,11 @@
     function appendMessageToUI(data) {
         if (!chatContainer) return;
 
+        chatContainer.appendChild(buildMessageElement(data));
+        chatContainer.scrollTop = chatContainer.scrollHeight;
+    }
+
+    function buildMessageElement(data) {
         const messageType = data.isMe ? 'sent' : 'received';
         const avatarName = data.isMe ? userName : receiverName;
         const initial = avatarName[0].toUpperCase();
@@ -124,9 +210,29 @@
                 </div>
             `;
 
-        messageDiv.querySelector('.message-bubble').textContent = data.content;
-        chatContainer.appendChild(messageDiv);
-        chatContainer.scrollTop = chatContainer.scrollHeight;
+        const bubble = messageDiv.querySelector('.message-bubble');
+        bubble.textContent = data.content;
+        if (data.attachment) {
+            bubble.appendChild(renderAttachment(data.attachment));
+        }
+        return messageDiv;
+    }
+
+    function renderAttachment(sha256) {
+        // Link to the file; images swap in their thumbnail when the server can make one
+        const url = `/api/attachments/${sha256}`;
+        const link = document.createElement('a');
+        link.className = 'message-attachment';
+        link.href = url;
+        link.target = '_blank';
+        link.textContent = 'Attachment';
+
+        const thumbnail = new Image();
+        thumbnail.loading = 'lazy';
+        thumbnail.alt = 'Attachment';
+        thumbnail.onload = () => link.replaceChildren(thumbnail);
+        thumbnail.src = `${url}/thumbnail`;
+        return link;
     }
 
     function updateSidebarBadge(userId, count) {
@@ -155,8 +261,10 @@
         };
 
         appendMessageToUI(messageData);
+        stopTyping();
 
         window.socketService.send({
+            type: 'chat',
             receiver_id: receiverId,
             content: text,
             tempId: tempId
@@ -166,11 +274,79 @@
         input.focus();
     }
 
+    async function sendAttachment() {
+        const file = attachInput.files[0];
+        attachInput.value = '';
+        if (!file || !window.socketService) return;
+
+        const tempId = `temp_${Date.now()}`;
+        try {
+            // Raw body upload, the server streams it straight to disk
+            const response = await fetch('/api/attachments', {
+                method: 'POST',
+                headers: { 'Content-Type': file.type || 'application/octet-stream' },
+                body: file
+            });
+            if (!response.ok) throw new Error(`Upload failed (${response.status})`);
+            const uploaded = await response.json();
+
+            const content = input.value.trim();
+            appendMessageToUI({
+                content: content,
+                timestamp: new Date().toISOString(),
+                attachment: uploaded.sha256,
+                isMe: true,
+                tempId: tempId
+            });
+
+            window.socketService.send({
+                type: 'chat',
+                receiver_id: receiverId,
+                content: content,
+                attachment: uploaded.sha256,
+                tempId: tempId
+            });
+            input.value = '';
+        } catch (error) {
+            console.error('Failed to send attachment:', error);
+        }
+    }
+
+    function readInitialPage() {
+        // The server renders the newest page into the document, so opening a chat needs no fetch
+        const script = document.getElementById('initialMessages');
+        if (!script) return null;
+        try {
+            return JSON.parse(script.textContent);
+        } catch (e) {
+            console.error('Malformed initial messages', e);
+            return null;
+        }
+    }
+
+    function applyPage(page) {
+        historyCursor = page.before;
+        hasOlderMessages = page.has_more;
+        pageSize = page.page_size || pageSize;
+    }
+
     async function loadHistory() {
+        const initialPage = readInitialPage();
+        if (initialPage) {
+            chatContainer.innerHTML = '';
+            initialPage.messages.forEach(item => {
+                item.isMe = (item.sender_id != receiverId);
+                appendMessageToUI(item);
+            });
+            applyPage(initialPage);
+            updateSidebarBadge(receiverId, 0);
+            return;
+        }
+
         chatContainer.innerHTML = '<div class="message-history-loading"><svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round" class="lucide lucide-loader-icon lucide-loader"><path d="M12 2v4"/><path d="m16.2 7.8 2.9-2.9"/><path d="M18 12h4"/><path d="m16.2 16.2 2.9 2.9"/><path d="M12 18v4"/><path d="m4.9 19.1 2.9-2.9"/><path d="M2 12h4"/><path d="m4.9 4.9 2.9 2.9"/></svg></div>';
 
         try {
-            const response = await fetch(`/api/messages/${receiverId}`);
+            const response = await fetch(`/api/messages/${receiverId}?limit=${pageSize}`);
             if (!response.ok) throw new Error('Network error');
 
             const data = await response.json();
@@ -180,6 +356,7 @@
                 item.isMe = (item.sender_id != receiverId);
                 appendMessageToUI(item);
             });
+            applyPage({ before: data.length ? data[0].id : null, has_more: data.length == pageSize });
 
             updateSidebarBadge(receiverId, 0);
         } catch (error) {
@@ -188,5 +365,32 @@
         }
     }
 
+    async function loadOlderMessages() {
+        if (loadingOlder || !hasOlderMessages || historyCursor === null) return;
+        loadingOlder = true;
+
+        try {
+            const response = await fetch(`/api/messages/${receiverId}?before=${historyCursor}&limit=${pageSize}`);
+            if (!response.ok) throw new Error('Network error');
+            const data = await response.json();
+
+            // Prepend while keeping the visible messages where they are
+            const previousHeight = chatContainer.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            data.forEach(item => {
+                item.isMe = (item.sender_id != receiverId);
+                fragment.appendChild(buildMessageElement(item));
+            });
+            chatContainer.insertBefore(fragment, chatContainer.firstChild);
+            chatContainer.scrollTop += chatContainer.scrollHeight - previousHeight;
+
+            applyPage({ before: data.length ? data[0].id : null, has_more: data.length == pageSize });
+        } catch (error) {
+            console.error('Failed to load older messages:', error);
+        } finally {
+            loadingOlder = false;
+        }
+    }
+
     document.addEventListener('DOMContentLoaded', init);
 })();
\ No newline at end of file
@@ -1,11 +1,10 @@
 async function loadUsers() {
     const res = await fetch('/api/users');
-    const users = await res.json(); // Data is [[id, count, name], ...]
+    const users = await res.json(); // Data is [{id, username, unread_count, is_online}, ...]
 
     const container = document.getElementById('userList');
 
-    // We destructure [id, unread, name] directly from each user array
-    container.innerHTML = users.map(([id, name, unread, isOnline]) => `
+    container.innerHTML = users.map(({ id, username: name, unread_count: unread, is_online: isOnline }) => `
         <a class="user-item" href="/nexus/chat/dm/${id}" data-user-id="${id}">
             <div class="user-avatar">
                 ${name[0].toUpperCase()}
@@ -33,8 +32,16 @@ class SocketService extends EventTarget {
         this.socket = null;
         this.reconnectAttempt = 0;
         this.maxReconnectionDelay = 30000;
+        this.reconnectAfter = null;
+        // set by the server's `reconnect` frame when it is draining for a deploy
         this.messageQueue = [];
         this.messageHandlers = new Map();
+        this.heartbeatTimer = null;
+        // keeps the socket marked active while idle; the server closes silent sockets
+
+        this.addEventListener('reconnect', (event) => {
+            this.reconnectAfter = event.detail.after_ms;
+        });
 
         this.connect();
     }
@@ -51,6 +58,13 @@ class SocketService extends EventTarget {
             }
             this.dispatchEvent(new CustomEvent('status', { detail: 'connected' }));
             loadUsers();
+
+            clearInterval(this.heartbeatTimer);
+            this.heartbeatTimer = setInterval(() => {
+                if (this.socket.readyState === WebSocket.OPEN) {
+                    this.socket.send(JSON.stringify({ type: 'heartbeat' }));
+                }
+            }, 25000);
         }
 
         this.socket.onmessage = (event) => {
@@ -64,9 +78,14 @@ class SocketService extends EventTarget {
             }
         }
 
-        this.socket.onclose = () => {
+        this.socket.onclose = (event) => {
+            clearInterval(this.heartbeatTimer);
             this.dispatchEvent(new CustomEvent('status', { detail: 'disconnected' }));
-            this.scheduleReconnect();
+            if (this.reconnectAfter !== null || event.code === 1012) {
+                this.scheduleHandoff();
+            } else {
+                this.scheduleReconnect();
+            }
         }
 
         this.socket.onerror = (error) => {
@@ -85,6 +104,15 @@ class SocketService extends EventTarget {
         }, delay);
     }
 
+    scheduleHandoff() {
+        // Server restart: come back after the server-assigned (or a random) delay, not all at once
+        const delay = this.reconnectAfter ?? Math.random() * 10000;
+        this.reconnectAfter = null;
+        console.warn(`Server restarting, reconnecting in ${Math.round(delay) / 1000}`)
+
+        setTimeout(() => this.connect(), delay);
+    }
+
     send(payload) {
         const message = JSON.stringify(payload);
         if (this.socket && this.socket.readyState === WebSocket.OPEN) {